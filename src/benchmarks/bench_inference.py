@@ -0,0 +1,114 @@
+import os, sys, json, time, platform, argparse
+import numpy as np
+
+# Ensure repo root on path when running as a script
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from src.benchmarks.bench_pipelines import _git_commit, rss_hwm
+from src.models.quantize import BACKENDS, load_inference_model
+from src.utils.metrics import StreamingMetrics
+from src.utils.tensor_cache import MemmapSequence
+
+# Accuracy vs latency of the float model and its quantized exports
+# (src/models/quantize.py) on a tensor-cache split, CPU only. Per model:
+#   quality - one full pass at --batch_size: loss, accuracy, exact AUC/AP, ECE
+#   latency - per-call times at each --latency_batch (1 = single request) on
+#             the split's first images, after --warmup untimed calls
+# The first --models entry is the reference for AUC deltas and speedups.
+
+def _split_images(seq, n):
+    xs = []
+    for i in range(len(seq)):
+        xs.append(seq[i][0])
+        if sum(map(len, xs)) >= n:
+            break
+    return np.concatenate(xs)[:n]
+
+def quality(model, seq):
+    metrics = StreamingMetrics(len(seq.class_indices), exact=True)
+    t0 = time.perf_counter()
+    for i in range(len(seq)):
+        x, y = seq[i]
+        metrics.update(y, model.predict_on_batch(x))
+    out = metrics.result()
+    out["pass_s"] = time.perf_counter() - t0
+    return out
+
+def latency(model, images, batch, reps=50, warmup=3, budget=10.0):
+    x = images[:batch]
+    if len(x) < batch:
+        x = np.resize(images, (batch,) + images.shape[1:])  # tile a small split up to the batch size
+    for _ in range(warmup):
+        model.predict_on_batch(x)
+    times, t_end = [], time.perf_counter() + budget
+    for _ in range(reps):
+        t0 = time.perf_counter()
+        model.predict_on_batch(x)
+        times.append(time.perf_counter() - t0)
+        if time.perf_counter() > t_end:
+            break
+    ms = np.asarray(times) * 1e3
+    return {"batch": batch, "calls": len(times), "p50_ms": float(np.percentile(ms, 50)),
+            "p99_ms": float(np.percentile(ms, 99)), "img_per_s": batch * len(times) / (ms.sum() / 1e3)}
+
+def run(models, cache_dir, split="test", backend="auto", num_threads=None, batch_size=32, latency_batches=(1, 32),
+        reps=50, budget=10.0, log=print):
+    seq = MemmapSequence(cache_dir, split, batch_size=batch_size, shuffle=False)
+    images = _split_images(seq, max(latency_batches))
+    results = []
+    for path in models:
+        model = load_inference_model(path, backend, num_threads)
+        r = {"model": path, "backend": type(model).__name__, "size_bytes": os.path.getsize(path),
+             "quality": quality(model, seq), "latency": [latency(model, images, b, reps, budget=budget) for b in latency_batches]}
+        results.append(r)
+        q = r["quality"]
+        log(f"{os.path.basename(path):<36} AUC {q.get('roc_auc', float('nan')):.4f}  acc {q['accuracy']:.4f}  "
+            + "  ".join(f"b{l['batch']} {l['p50_ms']:.2f} ms" for l in r["latency"]))
+    ref = results[0]
+    for r in results:
+        r["auc_delta"] = r["quality"].get("roc_auc", np.nan) - ref["quality"].get("roc_auc", np.nan)
+        r["accuracy_delta"] = r["quality"]["accuracy"] - ref["quality"]["accuracy"]
+        r["speedup"] = {str(l["batch"]): b["p50_ms"] / max(l["p50_ms"], 1e-9) for l, b in zip(r["latency"], ref["latency"])}
+    return results
+
+def report(results):
+    """Markdown table: quality deltas and p50 speedups against the first model."""
+    batches = [l["batch"] for l in results[0]["latency"]]
+    head = "| model | MiB | AUC | dAUC | acc | dacc | ECE | " + " | ".join(f"b{b} p50 ms (x)" for b in batches) + " |"
+    lines = [head, "|" + "---|" * (7 + len(batches))]
+    for r in results:
+        q = r["quality"]
+        cells = [os.path.basename(r["model"]), f"{r['size_bytes'] / 2**20:.2f}", f"{q.get('roc_auc', float('nan')):.4f}",
+                 f"{r['auc_delta']:+.4f}", f"{q['accuracy']:.4f}", f"{r['accuracy_delta']:+.4f}", f"{q['ece']:.4f}"]
+        cells += [f"{l['p50_ms']:.2f} (x{r['speedup'][str(l['batch'])]:.2f})" for l in r["latency"]]
+        lines.append("| " + " | ".join(cells) + " |")
+    return "\n".join(lines) + "\n"
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--models", nargs="+", required=True, help="float .h5 first, then .tflite exports to compare against it")
+    ap.add_argument("--tensor_cache", required=True, help="tensor cache dir (src/utils/tensor_cache.py) holding the split")
+    ap.add_argument("--split", default="test")
+    ap.add_argument("--backend", choices=BACKENDS, default="auto")
+    ap.add_argument("--num_threads", type=int, default=None, help="TFLite interpreter threads")
+    ap.add_argument("--batch_size", type=int, default=32, help="batch size of the quality pass")
+    ap.add_argument("--latency_batches", type=int, nargs="+", default=[1, 32])
+    ap.add_argument("--reps", type=int, default=50, help="timed calls per (model, batch)")
+    ap.add_argument("--budget", type=float, default=10.0, help="seconds per (model, batch) before stopping early")
+    ap.add_argument("--out", default=None, help="result JSON (default experiments/benchmarks/inference_<commit>.json); a .md report goes next to it")
+    args = ap.parse_args()
+
+    commit = _git_commit()
+    results = run(args.models, args.tensor_cache, args.split, args.backend, args.num_threads, args.batch_size,
+                  args.latency_batches, args.reps, args.budget)
+    meta = {"commit": commit, "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+            "numpy": np.__version__, "platform": platform.platform(), "cpu_count": os.cpu_count(),
+            "rss_hwm_bytes": rss_hwm(), "args": vars(args)}
+    out = args.out or os.path.join("experiments", "benchmarks", f"inference_{commit}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump({"meta": meta, "results": results}, f, indent=2)
+    table = report(results)
+    with open(os.path.splitext(out)[0] + ".md", "w") as f:
+        f.write(table)
+    print(table)
+    print("Wrote", out)
@@ -0,0 +1,195 @@
+import os, sys, json, time, platform, resource, subprocess, argparse, tracemalloc
+import numpy as np
+import cv2
+from concurrent.futures import ProcessPoolExecutor
+
+# Ensure repo root on path when running as a script
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from src.preprocessing.pipelines import (PIPELINES, BATCH_PIPELINES, BUFFERS, THREAD_POLICIES,
+                                         cv_threads_for, init_worker)
+from src.benchmarks.synthetic import SIZES, synthetic_mammogram
+
+# Cost of every PIPELINES entry on synthetic mammograms, offline and CPU only.
+# Modes per (pipeline, size):
+#   single   - PIPELINES[name](img, dst=buf), one image per call
+#   batch    - BATCH_PIPELINES[name](imgs, out=bufs), --batch images per call
+#   parallel - single mode fanned out over a process pool (--workers)
+# Timed runs are untraced; memory comes from one extra tracemalloc pass
+# (numpy + cv2 output allocations) and the process RSS high-water mark.
+# Python has no per-allocation hook for numpy data, so "allocations" are
+# reported as traced peak bytes and minor page faults per image (fresh
+# memory being touched; reused buffers fault ~0).
+
+MODES = ("single", "batch", "parallel")
+
+def rss_hwm():
+    """Peak RSS of this process in bytes (VmHWM), or ru_maxrss where /proc is unavailable."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def _faults():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_minflt
+
+def _traced(call):
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    call()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak - base
+
+def _repeat(call, reps, budget):
+    """Per-call seconds for up to `reps` calls, stopping early (after >= 1) once `budget` seconds are spent."""
+    times, t_end = [], time.perf_counter() + budget
+    for _ in range(reps):
+        t0 = time.perf_counter()
+        call()
+        times.append(time.perf_counter() - t0)
+        if time.perf_counter() > t_end:
+            break
+    return times
+
+def _summary(lat, n_images, wall):
+    lat_ms = np.asarray(lat) * 1e3
+    return {"images": n_images, "p50_ms": float(np.percentile(lat_ms, 50)), "p90_ms": float(np.percentile(lat_ms, 90)),
+            "p99_ms": float(np.percentile(lat_ms, 99)), "mean_ms": float(lat_ms.mean()),
+            "img_per_s": n_images / max(wall, 1e-9)}
+
+def bench_single(name, imgs, reps, budget):
+    fn = PIPELINES[name]
+    dst = BUFFERS.take(imgs[0].shape)
+    fn(imgs[0], dst=dst)  # warm-up: caches, LUTs, CLAHE registry
+    i = [0]
+    def call():
+        fn(imgs[i[0] % len(imgs)], dst=dst)
+        i[0] += 1
+    f0, t0 = _faults(), time.perf_counter()
+    lat = _repeat(call, reps, budget)
+    wall, faults = time.perf_counter() - t0, _faults() - f0
+    row = _summary(lat, len(lat), wall)
+    row["peak_traced_bytes"] = _traced(lambda: fn(imgs[0], dst=dst))
+    row["minor_faults_per_img"] = faults / len(lat)
+    BUFFERS.give(dst)
+    return row
+
+def bench_batch(name, imgs, reps, budget):
+    fn = BATCH_PIPELINES[name]
+    bufs = [BUFFERS.take(im.shape) for im in imgs]
+    fn(imgs, out=bufs)
+    f0, t0 = _faults(), time.perf_counter()
+    calls = _repeat(lambda: fn(imgs, out=bufs), max(1, reps // len(imgs)), budget)
+    wall, faults = time.perf_counter() - t0, _faults() - f0
+    n = len(calls) * len(imgs)
+    # per-image latency inside a batch call = call time / batch size
+    row = _summary([c / len(imgs) for c in calls], n, wall)
+    row["peak_traced_bytes"] = _traced(lambda: fn(imgs, out=bufs))  # per call: peaks don't add up per image
+    row["minor_faults_per_img"] = faults / n
+    row["batch"] = len(imgs)
+    BUFFERS.give(*bufs)
+    return row
+
+# -------- parallel mode: workers build their own images, only names/indices cross processes --------
+
+_W_IMGS = []
+
+def _init_parallel(shape, n, cv_threads):
+    init_worker(cv_threads)
+    _W_IMGS[:] = [synthetic_mammogram(shape, seed=i) for i in range(n)]
+
+def _run_parallel(name, i):
+    img = _W_IMGS[i % len(_W_IMGS)]
+    dst = BUFFERS.take(img.shape)
+    t0 = time.perf_counter()
+    PIPELINES[name](img, dst=dst)
+    secs = time.perf_counter() - t0
+    BUFFERS.give(dst)
+    return secs, rss_hwm()
+
+def bench_parallel(name, shape, n_imgs, reps, budget, workers, threads):
+    cv_threads = cv_threads_for(workers, threads)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_parallel,
+                             initargs=(shape, n_imgs, cv_threads)) as ex:
+        list(ex.map(_run_parallel, [name] * workers, range(workers)))  # warm every worker
+        # rounds of `workers` tasks until reps or the time budget runs out
+        lat, hwm, t0 = [], 0, time.perf_counter()
+        while len(lat) < reps:
+            for secs, rss in ex.map(_run_parallel, [name] * workers, range(len(lat), len(lat) + workers)):
+                lat.append(secs)
+                hwm = max(hwm, rss)
+            if time.perf_counter() - t0 > budget:
+                break
+        wall = time.perf_counter() - t0
+    row = _summary(lat, len(lat), wall)
+    row.update(workers=workers, cv_threads=cv_threads, worker_rss_hwm_bytes=hwm)
+    return row
+
+def run(names, sizes, modes, reps=20, batch=4, workers=2, threads="pool", budget=10.0, log=print):
+    results = []
+    for size in sizes:
+        shape = SIZES[size]
+        imgs = [synthetic_mammogram(shape, seed=i) for i in range(max(batch, 1))]
+        for name in names:
+            for mode in modes:
+                if mode == "single":
+                    row = bench_single(name, imgs, reps, budget)
+                elif mode == "batch":
+                    row = bench_batch(name, imgs, reps, budget)
+                else:
+                    row = bench_parallel(name, shape, len(imgs), reps, budget, workers, threads)
+                row = {"pipeline": name, "size": size, "shape": list(shape), "mode": mode, **row}
+                results.append(row)
+                log(f"{name:<14}{size:>6}{mode:>10}{row['p50_ms']:>10.2f}{row['p99_ms']:>10.2f}{row['img_per_s']:>10.1f}")
+    return results
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def compare(results, baseline_file):
+    """Print img/s ratios against an earlier result file, matched on (pipeline, size, mode)."""
+    with open(baseline_file) as f:
+        base = {(r["pipeline"], r["size"], r["mode"]): r for r in json.load(f)["results"]}
+    print(f"vs {baseline_file}:")
+    for r in results:
+        b = base.get((r["pipeline"], r["size"], r["mode"]))
+        if b:
+            print(f"  {r['pipeline']:<14}{r['size']:>6}{r['mode']:>10}  x{r['img_per_s'] / max(b['img_per_s'], 1e-9):.2f} img/s"
+                  f"  p50 {b['p50_ms']:.2f} -> {r['p50_ms']:.2f} ms")
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pipelines", nargs="+", default=list(PIPELINES))
+    ap.add_argument("--sizes", nargs="+", default=list(SIZES), choices=list(SIZES))
+    ap.add_argument("--modes", nargs="+", default=list(MODES), choices=MODES)
+    ap.add_argument("--reps", type=int, default=20, help="images timed per (pipeline, size, mode)")
+    ap.add_argument("--budget", type=float, default=10.0, help="seconds per (pipeline, size, mode) before stopping early")
+    ap.add_argument("--batch", type=int, default=4, help="images per batch-form call")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="processes in parallel mode")
+    ap.add_argument("--threads", choices=THREAD_POLICIES, default="pool", help="OpenCV threading policy in parallel mode")
+    ap.add_argument("--out", default=None, help="result JSON (default experiments/benchmarks/pipelines_<commit>.json)")
+    ap.add_argument("--compare", default=None, help="earlier result JSON to print speedups against")
+    args = ap.parse_args()
+
+    commit = _git_commit()
+    print(f"{'pipeline':<14}{'size':>6}{'mode':>10}{'p50 ms':>10}{'p99 ms':>10}{'img/s':>10}")
+    results = run(args.pipelines, args.sizes, args.modes, args.reps, args.batch, args.workers, args.threads, args.budget)
+    meta = {"commit": commit, "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+            "numpy": np.__version__, "opencv": cv2.__version__, "platform": platform.platform(),
+            "cpu_count": os.cpu_count(), "cv_threads": cv2.getNumThreads(), "rss_hwm_bytes": rss_hwm(),
+            "args": vars(args)}
+    out = args.out or os.path.join("experiments", "benchmarks", f"pipelines_{commit}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump({"meta": meta, "results": results}, f, indent=2)
+    print("Wrote", out)
+    if args.compare:
+        compare(results, args.compare)
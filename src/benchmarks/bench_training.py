@@ -0,0 +1,133 @@
+import os, sys, json, time, platform, subprocess, argparse
+import numpy as np
+
+# Ensure repo root on path when running as a script
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from src.benchmarks.bench_pipelines import _git_commit
+
+# Training steps/sec of build_cancer_net per (mode, threading) on CPU. Each
+# configuration runs in its own child process, since the dtype policy is
+# global and TF's thread pools are fixed once the runtime starts. A child
+# seeds everything, runs --warmup untimed steps (tracing / XLA compilation),
+# times --steps train_on_batch calls on the same batches, then scores a
+# held-out set, so modes can be checked for equal loss as well as speed.
+# Batches come from a tensor cache's train/val splits or are synthetic.
+
+MODES = {"float32": ("float32", False), "xla": ("float32", True),
+         "bf16": ("mixed_bfloat16", False), "bf16_xla": ("mixed_bfloat16", True)}
+
+def _batches(cache_dir, split, batch_size, n, img_size, seed):
+    if cache_dir:
+        from src.utils.tensor_cache import MemmapSequence
+        seq = MemmapSequence(cache_dir, split, batch_size=batch_size, shuffle=False)
+        return [seq[i % len(seq)] for i in range(n)]
+    rng = np.random.default_rng(seed)
+    out = []
+    for _ in range(n):
+        y = rng.integers(0, 2, batch_size)
+        # class-dependent brightness so the synthetic task is learnable
+        x = rng.random((batch_size,) + tuple(img_size) + (1,), dtype=np.float32) * 0.5 + 0.5 * y[:, None, None, None]
+        out.append((x.astype(np.float32), np.eye(2, dtype=np.float32)[y]))
+    return out
+
+def worker(cfg):
+    """Child side: configure, build, time, score; returns one result dict."""
+    from src.models.train import configure_runtime
+    runtime = configure_runtime(cfg["precision"], cfg["intra_op"], cfg["inter_op"])
+    import keras
+    from src.models.cancer_net import build_cancer_net
+    keras.utils.set_random_seed(cfg["seed"])
+    img_size = tuple(cfg["img_size"])
+    if cfg["tensor_cache"]:
+        with open(os.path.join(cfg["tensor_cache"], "meta.json")) as f:
+            img_size = tuple(json.load(f)["img_size"])
+    model = build_cancer_net(img_size + (1,), jit_compile=cfg["jit_compile"])
+    train = _batches(cfg["tensor_cache"], "train", cfg["batch_size"], cfg["batches"], img_size, cfg["seed"])
+    held = _batches(cfg["tensor_cache"], "val", cfg["batch_size"], 4, img_size, cfg["seed"] + 1)
+
+    t0 = time.perf_counter()
+    for i in range(cfg["warmup"]):
+        model.train_on_batch(*train[i % len(train)])
+    warmup_s = time.perf_counter() - t0
+    times, losses = [], []
+    for i in range(cfg["steps"]):
+        t = time.perf_counter()
+        loss = model.train_on_batch(*train[i % len(train)])
+        times.append(time.perf_counter() - t)
+        losses.append(float(np.ravel(loss)[0]))
+    held_loss, held_acc = model.evaluate(np.concatenate([x for x, _ in held]), np.concatenate([y for _, y in held]),
+                                         batch_size=cfg["batch_size"], verbose=0)
+    ms = np.asarray(times) * 1e3
+    return {**cfg, "runtime": runtime, "warmup_s": warmup_s, "steps_per_s": len(times) / (ms.sum() / 1e3),
+            "img_per_s": cfg["batch_size"] * len(times) / (ms.sum() / 1e3),
+            "p50_step_ms": float(np.percentile(ms, 50)), "p90_step_ms": float(np.percentile(ms, 90)),
+            "train_loss_last10": float(np.mean(losses[-10:])), "held_loss": float(held_loss), "held_acc": float(held_acc)}
+
+def run_child(cfg, timeout=3600):
+    cmd = [sys.executable, os.path.abspath(__file__), "--worker", json.dumps(cfg)]
+    proc = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+    lines = [l for l in proc.stdout.splitlines() if l.startswith("{")]
+    if proc.returncode != 0 or not lines:
+        return {**cfg, "error": (proc.stderr.strip().splitlines() or [f"exit {proc.returncode}"])[-1]}
+    return json.loads(lines[-1])
+
+def run(modes, threads, tensor_cache=None, img_size=(128,128), batch_size=32, steps=50, warmup=5, batches=8, seed=42, log=print):
+    results = []
+    for mode in modes:
+        precision, jit = MODES[mode]
+        for intra, inter in threads:
+            cfg = {"mode": mode, "precision": precision, "jit_compile": jit, "intra_op": intra, "inter_op": inter,
+                   "tensor_cache": tensor_cache, "img_size": list(img_size), "batch_size": batch_size,
+                   "steps": steps, "warmup": warmup, "batches": batches, "seed": seed}
+            r = run_child(cfg)
+            results.append(r)
+            if "error" in r:
+                log(f"{mode:<10}{intra:>6}{inter:>6}  failed: {r['error']}")
+            else:
+                log(f"{mode:<10}{intra:>6}{inter:>6}{r['steps_per_s']:>10.2f}{r['p50_step_ms']:>10.1f}"
+                    f"{r['warmup_s']:>10.1f}{r['held_loss']:>10.4f}{r['held_acc']:>8.3f}")
+    ok = [r for r in results if "error" not in r]
+    if ok:
+        ref = ok[0]
+        for r in ok:
+            r["speedup"] = r["steps_per_s"] / max(ref["steps_per_s"], 1e-9)
+            r["held_loss_delta"] = r["held_loss"] - ref["held_loss"]
+    return results
+
+def _threads(spec):
+    intra, inter = spec.split(":")
+    return int(intra), int(inter)
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--modes", nargs="+", default=list(MODES), choices=list(MODES), help="first one is the reference")
+    ap.add_argument("--threads", nargs="+", type=_threads, default=None,
+                    help="intra:inter pairs (0 = TF default); default 0:0, <cpus>:1, <cpus>:2")
+    ap.add_argument("--tensor_cache", default=None, help="time on this tensor cache's train split (default: synthetic batches)")
+    ap.add_argument("--img_size", type=int, nargs=2, default=[128,128], help="synthetic image size H W")
+    ap.add_argument("--batch_size", type=int, default=32)
+    ap.add_argument("--steps", type=int, default=50, help="timed train steps per configuration")
+    ap.add_argument("--warmup", type=int, default=5, help="untimed steps first (graph tracing / XLA compile)")
+    ap.add_argument("--batches", type=int, default=8, help="distinct batches cycled through")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--out", default=None, help="result JSON (default experiments/benchmarks/training_<commit>.json)")
+    ap.add_argument("--worker", default=None, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.worker:
+        print(json.dumps(worker(json.loads(args.worker))))
+        sys.exit(0)
+
+    cpus = os.cpu_count() or 1
+    threads = args.threads or [(0, 0), (cpus, 1), (cpus, 2)]
+    commit = _git_commit()
+    print(f"{'mode':<10}{'intra':>6}{'inter':>6}{'steps/s':>10}{'p50 ms':>10}{'warmup s':>10}{'held loss':>10}{'acc':>8}")
+    results = run(args.modes, threads, args.tensor_cache, tuple(args.img_size), args.batch_size, args.steps,
+                  args.warmup, args.batches, args.seed)
+    meta = {"commit": commit, "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+            "platform": platform.platform(), "cpu_count": cpus, "args": vars(args)}
+    out = args.out or os.path.join("experiments", "benchmarks", f"training_{commit}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump({"meta": meta, "results": results}, f, indent=2)
+    print("Wrote", out)
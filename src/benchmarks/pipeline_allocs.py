@@ -0,0 +1,69 @@
+import os, sys, json, time, argparse, tracemalloc
+import numpy as np
+
+# Ensure repo root on path when running as a script
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from src.preprocessing.pipelines import PIPELINES, BATCH_PIPELINES, BUFFERS
+from src.benchmarks.synthetic import SIZES, synthetic_mammogram
+
+# Memory cost per image of each pipeline. numpy (and OpenCV outputs, which
+# cv2 allocates as numpy arrays) report to tracemalloc, so the traced peak
+# during a call is the extra memory the call needed on top of its input.
+# Modes: "alloc" = fn(img) returns a fresh array; "dst" = fn(img, dst=buf)
+# with buf from BUFFERS, the path apply_pipeline/shards use.
+
+def measure(fn, reps=3):
+    """(peak extra bytes, bytes still held afterwards, ms) for the last of `reps` calls."""
+    for _ in range(reps - 1):
+        fn()  # warm caches (transfer functions, LUTs, pool)
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    t0 = time.perf_counter()
+    out = fn()
+    ms = (time.perf_counter() - t0) * 1e3
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del out
+    return peak - base, held - base, ms
+
+def run(names, size, reps=3, batch=4):
+    img = synthetic_mammogram(SIZES[size], seed=0)
+    imgs = [synthetic_mammogram(SIZES[size], seed=i) for i in range(batch)]
+    rows = []
+    for name in names:
+        fn = PIPELINES[name]
+        dst = BUFFERS.take(img.shape)
+        bufs = [BUFFERS.take(im.shape) for im in imgs]
+        modes = {
+            "alloc": lambda: fn(img),
+            "dst": lambda: fn(img, dst=dst),
+            "batch_alloc": lambda: BATCH_PIPELINES[name](imgs),
+            "batch_dst": lambda: BATCH_PIPELINES[name](imgs, out=bufs),
+        }
+        for mode, call in modes.items():
+            per = batch if mode.startswith("batch") else 1
+            peak, held, ms = measure(call, reps)
+            rows.append({"pipeline": name, "mode": mode, "size": size, "image_bytes": img.nbytes,
+                         "peak_extra_bytes": peak // per, "held_bytes": held // per, "ms": ms / per,
+                         # full-size image equivalents allocated per image (output included)
+                         "peak_extra_images": round(peak / per / img.nbytes, 2)})
+        BUFFERS.give(dst, *bufs)
+    return rows
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pipelines", nargs="+", default=list(PIPELINES))
+    ap.add_argument("--sizes", nargs="+", default=["1024", "full"], choices=list(SIZES))
+    ap.add_argument("--reps", type=int, default=3)
+    ap.add_argument("--batch", type=int, default=4, help="images per batch-form call")
+    ap.add_argument("--out", default=None, help="optional JSON file for the rows")
+    args = ap.parse_args()
+    rows = [r for size in args.sizes for r in run(args.pipelines, size, args.reps, args.batch)]
+    print(f"{'pipeline':<14}{'size':>6}{'mode':>13}{'peak/img':>10}{'held':>8}{'ms':>9}")
+    for r in rows:
+        print(f"{r['pipeline']:<14}{r['size']:>6}{r['mode']:>13}{r['peak_extra_images']:>10.2f}"
+              f"{r['held_bytes'] / r['image_bytes']:>8.2f}{r['ms']:>9.1f}")
+    if args.out:
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        with open(args.out, "w") as f:
+            json.dump(rows, f, indent=2)
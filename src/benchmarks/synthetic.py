@@ -0,0 +1,30 @@
+import numpy as np
+import cv2
+
+# Sizes benchmarks run at; "full" is a typical full-field CBIS-DDSM scan (H, W)
+SIZES = {"128": (128, 128), "512": (512, 512), "1024": (1024, 1024), "full": (4000, 3000)}
+
+def synthetic_mammogram(shape, seed=0):
+    """
+    Deterministic uint8 image with mammogram-like statistics: black background,
+    a breast region bulging from the left edge with intensity falling off
+    towards the skin line, low-frequency fibroglandular texture, a few masses
+    and micro-calcifications, plus sensor noise. Stands in for real scans so
+    benchmarks run offline.
+    """
+    h, w = shape
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[0:h, 0:w].astype(np.float32)
+    r = np.sqrt((xx / (0.8 * w)) ** 2 + ((yy - h / 2) / (0.48 * h)) ** 2)
+    breast = np.clip(1.0 - r, 0, 1) ** 0.35
+    tex = rng.standard_normal((max(4, h // 16), max(4, w // 16))).astype(np.float32)
+    tex = cv2.resize(cv2.GaussianBlur(tex, (0, 0), 1.5), (w, h), interpolation=cv2.INTER_CUBIC)
+    img = breast * (150 + 40 * tex)
+    for _ in range(3):
+        cy, cx, s = rng.uniform(0.25 * h, 0.75 * h), rng.uniform(0.05 * w, 0.5 * w), rng.uniform(0.01, 0.04) * max(h, w)
+        img += 60 * np.exp(-((yy - cy) ** 2 + (xx - cx) ** 2) / (2 * s * s)) * (breast > 0)
+    n_calc = max(1, h * w // 200_000)
+    ys, xs = rng.integers(0, h, n_calc), rng.integers(0, w // 2, n_calc)
+    img[ys, xs] = 255
+    img += rng.normal(0, 4, (h, w)).astype(np.float32) * (breast > 0)
+    return np.clip(img, 0, 255).astype(np.uint8)
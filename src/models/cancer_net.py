@@ -1,6 +1,8 @@
 from keras import models, layers
 
-def build_cancer_net(input_shape=(128,128,1), num_classes=2):
+def build_cancer_net(input_shape=(128,128,1), num_classes=2, jit_compile=False):
+    # layers follow the global dtype policy (see train.configure_runtime); the softmax
+    # head stays float32 so probabilities and the loss keep full precision under mixed_bfloat16
     inputs = layers.Input(shape=input_shape)
     x = layers.Conv2D(32, (3,3), strides=1, padding='same', activation='relu')(inputs)  # groups defaults to 1
     x = layers.MaxPooling2D((2,2))(x)
@@ -11,9 +13,9 @@ def build_cancer_net(input_shape=(128,128,1), num_classes=2):
     x = layers.Flatten()(x)
     x = layers.Dense(256, activation='relu')(x)
     x = layers.Dropout(0.5)(x)
-    outputs = layers.Dense(num_classes, activation='softmax')(x)
+    outputs = layers.Dense(num_classes, activation='softmax', dtype='float32')(x)
     model = models.Model(inputs, outputs)
-    model.compile(optimizer='adam', loss='categorical_crossentropy', metrics=['accuracy'])
+    model.compile(optimizer='adam', loss='categorical_crossentropy', metrics=['accuracy'], jit_compile=jit_compile)
     return model
 
 
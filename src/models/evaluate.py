@@ -1,11 +1,18 @@
 import os
+import sys
+import json
 import argparse
 import numpy as np
 import matplotlib.pyplot as plt
-from sklearn.metrics import classification_report, confusion_matrix, roc_auc_score, roc_curve
-from keras.models import load_model
 from keras.preprocessing.image import ImageDataGenerator
 
+# Ensure repo root on path when running as a script
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from src.utils.shards import ShardSequence
+from src.utils.tensor_cache import MemmapSequence
+from src.utils.metrics import StreamingMetrics
+from src.models.quantize import BACKENDS, load_inference_model
+
 def build_test_generator(test_dir, img_size=(128,128), gray=True, batch_size=32):
     color_mode = 'grayscale' if gray else 'rgb'
     datagen = ImageDataGenerator(rescale=1./255)
@@ -31,12 +38,7 @@ def plot_confusion_matrix(cm, classes, out_path):
     plt.savefig(out_path)
     plt.close()
 
-def plot_roc(y_true, y_pred_proba, classes, out_path):
-    # Works for binary; for multi-class extend to one-vs-rest
-    if y_pred_proba.shape[1] != 2:
-        return
-    fpr, tpr, _ = roc_curve(y_true[:,1], y_pred_proba[:,1])
-    auc = roc_auc_score(y_true[:,1], y_pred_proba[:,1])
+def plot_roc(fpr, tpr, auc, out_path):
     plt.figure(figsize=(5,4))
     plt.plot(fpr, tpr, label=f'AUC = {auc:.3f}')
     plt.plot([0,1], [0,1], 'k--', alpha=0.5)
@@ -49,63 +51,105 @@ def plot_roc(y_true, y_pred_proba, classes, out_path):
     plt.close()
 
 def main(args):
-    os.makedirs('results', exist_ok=True)
+    print(f"Loading model: {args.model} (backend {args.backend})")
+    model = load_inference_model(args.model, args.backend, args.num_threads)
 
-    print(f"Loading model: {args.model}")
-    model = load_model(args.model)
+    if args.manifest:
+        from src.utils.data_loader import make_manifest_generator
+        print(f"Reading test split from manifest: {args.manifest}")
+        gen = make_manifest_generator(args.manifest, "test", batch_size=args.batch_size,
+                                      img_size=(args.img_size[0], args.img_size[1]), shuffle=False)
+    elif args.tensor_cache:
+        print(f"Reading test split from tensor cache: {args.tensor_cache}")
+        gen = MemmapSequence(args.tensor_cache, "test", batch_size=args.batch_size, shuffle=False)
+    elif args.shards:
+        print(f"Reading test split from shards: {args.shards}")
+        gen = ShardSequence(args.shards, "test", batch_size=args.batch_size, shuffle=False)
+    else:
+        print(f"Building test generator from: {args.test_dir}")
+        gen = build_test_generator(
+            args.test_dir,
+            img_size=(args.img_size[0], args.img_size[1]),
+            gray=args.gray,
+            batch_size=args.batch_size
+        )
 
-    print(f"Building test generator from: {args.test_dir}")
-    gen = build_test_generator(
-        args.test_dir,
-        img_size=(args.img_size[0], args.img_size[1]),
-        gray=args.gray,
-        batch_size=args.batch_size
-    )
+    evaluate_model(model, gen, exact=not args.approx_metrics, n_bins=args.bins)
 
-    # Predict
-    print("Running inference...")
-    y_prob = model.predict(gen, verbose=1)
-    y_pred = np.argmax(y_prob, axis=1)
-    y_true = gen.classes
+def predict_pass(model, gen, metrics):
+    """One pass over gen's batches, feeding each batch's labels and probabilities to `metrics`."""
+    n = len(gen)
+    for i in range(n):
+        x, y = gen[i]
+        metrics.update(y, model.predict_on_batch(x))
+        if (i + 1) % max(1, n // 10) == 0 or i + 1 == n:
+            print(f"  {i + 1}/{n} batches")
+    return metrics
+
+def evaluate_model(model, gen, out_dir="results", exact=True, n_bins=1000):
+    """
+    Predict `gen` once (with .class_indices), print metrics and write report,
+    CSV and plots to out_dir. exact=False keeps only binned counts, so memory
+    does not grow with the test set; ROC/PR/AUC are then histogram approximations.
+    """
+    os.makedirs(out_dir, exist_ok=True)
     class_indices = gen.class_indices
     idx_to_class = {v:k for k,v in class_indices.items()}
     class_names = [idx_to_class[i] for i in range(len(idx_to_class))]
 
+    # Predict: a single pass; every metric below is accumulated batch by batch
+    print("Running inference...")
+    metrics = predict_pass(model, gen, StreamingMetrics(len(class_names), n_bins=n_bins, exact=exact))
+
     # Metrics
-    report = classification_report(y_true, y_pred, target_names=class_names, digits=4)
+    report = metrics.report(class_names, digits=4)
     print("Classification report:\n", report)
 
-    cm = confusion_matrix(y_true, y_pred)
+    cm = metrics.cm
     print("Confusion matrix:\n", cm)
 
     # Save artifacts
-    with open('results/classification_report.txt', 'w') as f:
+    with open(os.path.join(out_dir, 'classification_report.txt'), 'w') as f:
         f.write(report)
-    np.savetxt('results/confusion_matrix.csv', cm, fmt='%d', delimiter=',')
+    np.savetxt(os.path.join(out_dir, 'confusion_matrix.csv'), cm, fmt='%d', delimiter=',')
+    result = metrics.result()
+    with open(os.path.join(out_dir, 'metrics.json'), 'w') as f:
+        json.dump({**result, "calibration": metrics.calibration()}, f, indent=2)
 
-    # ROC (binary case)
-    y_true_onehot = np.eye(len(class_names))[y_true]
-    try:
-        plot_roc(y_true_onehot, y_prob, class_names, 'results/roc_curve.png')
-    except Exception as e:
-        print(f"ROC plot skipped: {e}")
+    # ROC (binary case; for multi-class extend to one-vs-rest)
+    if len(class_names) == 2 and "roc_auc" in result:
+        fpr, tpr, _ = metrics.roc_curve()
+        try:
+            plot_roc(fpr, tpr, result["roc_auc"], os.path.join(out_dir, 'roc_curve.png'))
+        except Exception as e:
+            print(f"ROC plot skipped: {e}")
 
     # Confusion matrix plot
     try:
-        plot_confusion_matrix(cm, class_names, 'results/confusion_matrix.png')
+        plot_confusion_matrix(cm, class_names, os.path.join(out_dir, 'confusion_matrix.png'))
     except Exception as e:
         print(f"CM plot skipped: {e}")
 
-    # Overall accuracy and loss (optional evaluate)
-    loss, acc = model.evaluate(gen, verbose=0)
-    print(f"Test loss: {loss:.4f} | Test accuracy: {acc:.4f}")
+    # Overall accuracy and loss, without a second model.evaluate pass
+    print(f"Test loss: {result['loss']:.4f} | Test accuracy: {result['accuracy']:.4f}"
+          + (f" | AUC: {result['roc_auc']:.4f} | AP: {result['average_precision']:.4f}" if "roc_auc" in result else "")
+          + f" | ECE: {result['ece']:.4f}")
+    return {"loss": result["loss"], "accuracy": result["accuracy"],
+            **{k: result[k] for k in ("roc_auc", "average_precision", "ece") if k in result}}
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
-    parser.add_argument("--model", type=str, default="models/baseline_cancernet.h5", help="Path to .h5 model")
+    parser.add_argument("--model", type=str, default="models/baseline_cancernet.h5", help="Path to .h5 model or quantized .tflite (src/models/quantize.py)")
+    parser.add_argument("--backend", choices=BACKENDS, default="auto", help="keras | tflite; auto picks by file extension")
+    parser.add_argument("--num_threads", type=int, default=None, help="TFLite interpreter threads (default: runtime's choice)")
     parser.add_argument("--test_dir", type=str, default="data/test", help="Test directory with class subfolders")
     parser.add_argument("--img_size", type=int, nargs=2, default=[128,128], help="Image size H W")
     parser.add_argument("--gray", action="store_true", help="Use grayscale mode")
     parser.add_argument("--batch_size", type=int, default=32)
+    parser.add_argument("--shards", type=str, default=None, help="Packed shard dir (src/utils/shards.py); replaces --test_dir")
+    parser.add_argument("--manifest", type=str, default=None, help="Split manifest CSV (src/utils/materialize.py); replaces --test_dir")
+    parser.add_argument("--tensor_cache", type=str, default=None, help="Memmap tensor cache dir (src/utils/tensor_cache.py); replaces --test_dir")
+    parser.add_argument("--approx_metrics", action="store_true", help="Histogram-binned ROC/PR/AUC in constant memory instead of keeping every score")
+    parser.add_argument("--bins", type=int, default=1000, help="Score bins for the ROC/PR histograms")
     args = parser.parse_args()
     main(args)
@@ -0,0 +1,133 @@
+import os, sys, json, time, argparse, threading
+import http.client
+from urllib.parse import urlparse
+import numpy as np
+import cv2
+
+# Ensure repo root on path when running as a script
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from src.benchmarks.synthetic import synthetic_mammogram
+
+# Load generator for src/models/serve.py: `concurrency` client threads, each
+# on its own keep-alive connection, send `requests` images in total and
+# record end-to-end latency. Images come from --images_dir or are synthetic.
+# --verify first scores each image alone (one request at a time) and then
+# checks every concurrent response against it, so state shared between the
+# server's request threads shows up as mismatched probabilities.
+
+IMG_EXTS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff")
+
+def payloads(images_dir=None, size=(1024, 1024), n=8):
+    if images_dir:
+        files = sorted(f for f in os.listdir(images_dir) if f.lower().endswith(IMG_EXTS))[:n]
+        out = []
+        for f in files:
+            with open(os.path.join(images_dir, f), "rb") as fh:
+                out.append(fh.read())
+        return out
+    return [cv2.imencode(".png", synthetic_mammogram(size, seed=i))[1].tobytes() for i in range(n)]
+
+def _post(conn, body):
+    conn.request("POST", "/predict", body=body, headers={"Content-Type": "application/octet-stream"})
+    resp = conn.getresponse()
+    data = resp.read()
+    return resp.status, data
+
+def reference_probs(url, bodies):
+    """Each body's probabilities from one sequential request per body (the single-threaded reference)."""
+    u = urlparse(url)
+    conn = http.client.HTTPConnection(u.hostname, u.port or 80, timeout=60)
+    out = []
+    for body in bodies:
+        status, data = _post(conn, body)
+        if status != 200:
+            raise RuntimeError(f"reference request failed ({status}): {data[:200]!r}")
+        out.append(np.asarray(json.loads(data)["probs"]))
+    conn.close()
+    return out
+
+def run_load(url, bodies, requests=500, concurrency=16, expected=None, atol=1e-4):
+    """expected: optional reference_probs(); responses further than atol from it count as mismatches."""
+    u = urlparse(url)
+    lock = threading.Lock()
+    latencies, errors, mismatches = [], [], []
+    counter = iter(range(requests))
+
+    def client():
+        conn = http.client.HTTPConnection(u.hostname, u.port or 80, timeout=60)
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                break
+            t0 = time.perf_counter()
+            try:
+                status, data = _post(conn, bodies[i % len(bodies)])
+                ok = status == 200
+                if ok and expected is not None:
+                    probs = np.asarray(json.loads(data)["probs"])
+                    if not np.allclose(probs, expected[i % len(bodies)], rtol=0, atol=atol):
+                        with lock:
+                            mismatches.append(i)
+            except (OSError, http.client.HTTPException):
+                ok = False
+                conn.close()
+                conn = http.client.HTTPConnection(u.hostname, u.port or 80, timeout=60)
+            secs = time.perf_counter() - t0
+            with lock:
+                (latencies if ok else errors).append(secs)
+        conn.close()
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+    lat = np.asarray(latencies) * 1e3
+    result = {"requests": requests, "ok": len(latencies), "errors": len(errors), "concurrency": concurrency,
+              "wall_s": wall, "req_per_s": len(latencies) / max(wall, 1e-9)}
+    if expected is not None:
+        result["mismatches"] = len(mismatches)
+    if len(lat):
+        result.update(p50_ms=float(np.percentile(lat, 50)), p90_ms=float(np.percentile(lat, 90)),
+                      p99_ms=float(np.percentile(lat, 99)), mean_ms=float(lat.mean()))
+    return result
+
+def server_stats(url):
+    u = urlparse(url)
+    conn = http.client.HTTPConnection(u.hostname, u.port or 80, timeout=10)
+    conn.request("GET", "/stats")
+    stats = json.loads(conn.getresponse().read())
+    conn.close()
+    return stats
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--url", default="http://127.0.0.1:8500")
+    ap.add_argument("--requests", type=int, default=500)
+    ap.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32], help="one run per level")
+    ap.add_argument("--images_dir", default=None, help="send these files instead of synthetic mammograms")
+    ap.add_argument("--size", type=int, nargs=2, default=[1024, 1024], help="synthetic image size H W")
+    ap.add_argument("--out", default=None, help="optional JSON file for the results")
+    ap.add_argument("--verify", action="store_true", help="check concurrent responses against one-at-a-time reference outputs")
+    ap.add_argument("--atol", type=float, default=1e-4, help="--verify tolerance on probabilities (batching may change float rounding)")
+    args = ap.parse_args()
+
+    bodies = payloads(args.images_dir, tuple(args.size))
+    expected = reference_probs(args.url, bodies) if args.verify else None
+    results = []
+    for c in args.concurrency:
+        r = run_load(args.url, bodies, args.requests, c, expected, args.atol)
+        results.append(r)
+        print(f"concurrency {c:>4}: {r['req_per_s']:.1f} req/s | p50 {r.get('p50_ms', float('nan')):.1f} ms"
+              f" | p99 {r.get('p99_ms', float('nan')):.1f} ms | errors {r['errors']}"
+              + (f" | mismatches {r['mismatches']}" if expected is not None else ""))
+    stats = server_stats(args.url)
+    print(f"server: {stats['requests']} requests, mean batch {stats['mean_batch']:.1f}, batch sizes {stats['batch_sizes']}")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"client": results, "server": stats}, f, indent=2)
+    if expected is not None and any(r["mismatches"] for r in results):
+        sys.exit("concurrent responses differ from the single-threaded reference")
@@ -0,0 +1,112 @@
+import os, sys, argparse
+import numpy as np
+
+# Ensure repo root on path when running as a script
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+# Post-training quantization of a trained CancerNet .h5 to TFLite, and a
+# loader that gives the .tflite the same predict_on_batch() as a Keras model,
+# so evaluate.py, serve.py and the benchmarks take either.
+#   float16 - weights stored as fp16 (half the size), float math
+#   dynamic - int8 weights, activations quantized on the fly
+#   int8    - full integer (weights + activations), calibrated on a tensor-cache split;
+#             input/output stay float32 so callers feed the usual x/255 batches
+
+MODES = ("int8", "dynamic", "float16")
+BACKENDS = ("auto", "keras", "tflite")
+
+def representative_data(cache_dir, split="train", batches=32, batch_size=8):
+    """Calibration batches for int8: the first `batches` of a tensor-cache split, one sample per yield."""
+    from src.utils.tensor_cache import MemmapSequence
+    seq = MemmapSequence(cache_dir, split, batch_size=batch_size, shuffle=False)
+    def gen():
+        for i in range(min(batches, len(seq))):
+            x, _ = seq[i]
+            for row in x:
+                yield [row[None].astype(np.float32)]
+    return gen
+
+def export_tflite(model_path, out_path, mode="int8", calib_cache=None, calib_batches=32):
+    import tensorflow as tf
+    from keras.models import load_model
+    model = load_model(model_path)
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if mode == "float16":
+        converter.target_spec.supported_types = [tf.float16]
+    elif mode == "int8":
+        if not calib_cache:
+            raise ValueError("int8 needs --calib_cache (a tensor cache dir) for activation ranges")
+        converter.representative_dataset = representative_data(calib_cache, batches=calib_batches)
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    elif mode != "dynamic":
+        raise ValueError(f"unknown mode {mode!r}; expected one of {MODES}")
+    blob = converter.convert()
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    with open(out_path, "wb") as f:
+        f.write(blob)
+    print(f"Wrote {out_path} ({mode}, {len(blob) / 2**20:.2f} MiB; float model {os.path.getsize(model_path) / 2**20:.2f} MiB)")
+    return out_path
+
+def _interpreter(path, num_threads):
+    try:
+        from tflite_runtime.interpreter import Interpreter  # slim runtime, no TensorFlow import
+    except ImportError:
+        import tensorflow as tf
+        Interpreter = tf.lite.Interpreter
+    return Interpreter(model_path=path, num_threads=num_threads)
+
+class TFLiteModel:
+    """
+    A .tflite model behind Keras' predict_on_batch(). The input tensor is
+    resized when the batch size changes (e.g. a short last batch); int8
+    inputs/outputs are (de)quantized with the tensor's scale and zero point.
+    Not thread-safe: one caller at a time, as with serve.py's batcher thread.
+    """
+    def __init__(self, path, num_threads=None):
+        self.path = path
+        self.interp = _interpreter(path, num_threads)
+        self.interp.allocate_tensors()
+        self.inp = self.interp.get_input_details()[0]
+        self.out = self.interp.get_output_details()[0]
+        self.batch = int(self.inp["shape"][0])
+
+    def predict_on_batch(self, x):
+        x = np.asarray(x, dtype=np.float32)
+        if len(x) != self.batch:
+            self.interp.resize_tensor_input(self.inp["index"], [len(x)] + list(x.shape[1:]))
+            self.interp.allocate_tensors()
+            self.inp = self.interp.get_input_details()[0]
+            self.out = self.interp.get_output_details()[0]
+            self.batch = len(x)
+        if self.inp["dtype"] != np.float32:
+            scale, zero = self.inp["quantization"]
+            info = np.iinfo(self.inp["dtype"])
+            x = np.clip(np.round(x / scale + zero), info.min, info.max).astype(self.inp["dtype"])
+        self.interp.set_tensor(self.inp["index"], x)
+        self.interp.invoke()
+        y = self.interp.get_tensor(self.out["index"])
+        if self.out["dtype"] != np.float32:
+            scale, zero = self.out["quantization"]
+            y = (y.astype(np.float32) - zero) * scale
+        return y
+
+def load_inference_model(path, backend="auto", num_threads=None):
+    """Keras model for .h5/.keras, TFLiteModel for .tflite (backend='auto' decides by extension)."""
+    if backend == "auto":
+        backend = "tflite" if path.endswith(".tflite") else "keras"
+    if backend == "tflite":
+        return TFLiteModel(path, num_threads)
+    from keras.models import load_model
+    return load_model(path)
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--model", default="models/baseline_cancernet.h5")
+    ap.add_argument("--mode", choices=MODES, default="int8")
+    ap.add_argument("--calib_cache", default=None, help="tensor cache dir whose train split calibrates int8 activations")
+    ap.add_argument("--calib_batches", type=int, default=32, help="8-image batches used for calibration")
+    ap.add_argument("--out", default=None, help="default: <model>_<mode>.tflite next to the model")
+    args = ap.parse_args()
+    out = args.out or f"{os.path.splitext(args.model)[0]}_{args.mode}.tflite"
+    export_tflite(args.model, out, args.mode, args.calib_cache, args.calib_batches)
@@ -0,0 +1,246 @@
+import os, sys, json, time, queue, signal, argparse, threading
+from collections import Counter, deque
+from concurrent.futures import Future
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+import numpy as np
+import cv2
+
+# Ensure repo root on path when running as a script
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from src.preprocessing.pipelines import init_worker
+from src.preprocessing.pipeline_graph import parse_spec
+from src.utils.shards import CLASSES, enhance_resize
+from src.utils.metrics import StreamingMetrics
+from src.models.quantize import BACKENDS, load_inference_model
+
+# Local scoring service. Each HTTP request thread decodes and enhances its
+# own image (same pipeline + nearest resize as the tensor cache used for
+# training); the model runs on a single thread that coalesces whatever is
+# waiting into one micro-batch per call.
+#
+#   POST /predict   body = encoded image (PNG/JPEG/...) -> {"probs", "label", "latency_ms", "batch_size"}
+#                   ?label=<class name or index> also scores the prediction against it
+#   GET  /stats     latency percentiles, throughput, batch-size histogram and,
+#                   once labelled requests arrive, running accuracy/AUC/calibration
+#   GET  /health
+
+class LatencyStats:
+    """Rolling window of request latencies plus batch-size counts."""
+    def __init__(self, window=10000):
+        self.lock = threading.Lock()
+        self.latencies = deque(maxlen=window)
+        self.batch_sizes = Counter()
+        self.count = 0
+        self.t0 = time.perf_counter()
+
+    def add(self, secs):
+        with self.lock:
+            self.latencies.append(secs)
+            self.count += 1
+
+    def add_batch(self, n):
+        with self.lock:
+            self.batch_sizes[n] += 1
+
+    def snapshot(self):
+        with self.lock:
+            lat = np.asarray(self.latencies) * 1e3
+            sizes = dict(sorted(self.batch_sizes.items()))
+            count = self.count
+        elapsed = time.perf_counter() - self.t0
+        n_batches = sum(sizes.values())
+        out = {"requests": count, "uptime_s": elapsed, "req_per_s": count / max(elapsed, 1e-9),
+               "batches": n_batches, "mean_batch": sum(k * v for k, v in sizes.items()) / max(n_batches, 1),
+               "batch_sizes": sizes}
+        if len(lat):
+            out.update(p50_ms=float(np.percentile(lat, 50)), p90_ms=float(np.percentile(lat, 90)),
+                       p99_ms=float(np.percentile(lat, 99)), mean_ms=float(lat.mean()))
+        return out
+
+class MicroBatcher:
+    """
+    Coalesces concurrent submit() calls into one predict_fn call. The worker
+    takes the first waiting input, keeps collecting until `max_batch` inputs
+    or `max_wait_ms` have passed, runs predict_fn on the stacked batch and
+    resolves each caller's Future with (its row, batch size).
+    """
+    def __init__(self, predict_fn, max_batch=32, max_wait_ms=5.0, stats=None):
+        self.predict_fn = predict_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1e3
+        self.stats = stats
+        self.q = queue.Queue()
+        self.thread = threading.Thread(target=self._loop, daemon=True)
+        self.thread.start()
+
+    def submit(self, x):
+        fut = Future()
+        self.q.put((x, fut))
+        return fut
+
+    def _collect(self):
+        first = self.q.get()
+        if first is None:
+            return None
+        batch, deadline = [first], time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.perf_counter()
+            try:
+                item = self.q.get(timeout=timeout) if timeout > 0 else self.q.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self.q.put(None)  # stop after this batch
+                break
+            batch.append(item)
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            if self.stats:
+                self.stats.add_batch(len(batch))
+            try:
+                probs = np.asarray(self.predict_fn(np.stack([x for x, _ in batch])))
+            except Exception as e:
+                for _, fut in batch:
+                    fut.set_exception(e)
+                continue
+            for (_, fut), p in zip(batch, probs):
+                fut.set_result((p, len(batch)))
+
+    def close(self):
+        self.q.put(None)
+        self.thread.join()
+
+class InferenceService:
+    """Model + preprocessing + batcher; predict_bytes() is what each request thread calls."""
+    def __init__(self, model, pipeline=None, img_size=(128,128), max_batch=32, max_wait_ms=5.0, timeout=30.0):
+        self.model = model
+        self.pipeline = pipeline
+        self.img_size = tuple(img_size)
+        self.timeout = timeout
+        self.stats = LatencyStats()
+        # binned, so a long-running server scores labelled traffic in constant memory
+        self.metrics = StreamingMetrics(len(CLASSES), exact=False)
+        self.metrics_lock = threading.Lock()
+        # one warm call so graph tracing doesn't land on the first request
+        model.predict_on_batch(np.zeros((1,) + self.img_size + (1,), np.float32))
+        self.batcher = MicroBatcher(model.predict_on_batch, max_batch, max_wait_ms, self.stats)
+
+    def preprocess(self, data):
+        img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_GRAYSCALE)
+        if img is None:
+            return None
+        x = enhance_resize([img], self.img_size, self.pipeline)[0]
+        return np.multiply(x[..., None], np.float32(1. / 255), dtype=np.float32)
+
+    def predict_bytes(self, data, label=None):
+        t0 = time.perf_counter()
+        x = self.preprocess(data)
+        if x is None:
+            raise ValueError("could not decode image")
+        probs, n = self.batcher.submit(x).result(self.timeout)
+        secs = time.perf_counter() - t0
+        self.stats.add(secs)
+        if label is not None:
+            with self.metrics_lock:
+                self.metrics.update([label], probs[None])
+        return {"probs": [float(p) for p in probs], "label": CLASSES[int(np.argmax(probs))],
+                "latency_ms": secs * 1e3, "batch_size": n}
+
+    def parse_label(self, value):
+        if value.isdigit() and int(value) < len(CLASSES):
+            return int(value)
+        if value in CLASSES:
+            return CLASSES.index(value)
+        raise ValueError(f"unknown label {value!r}; expected one of {CLASSES} or an index")
+
+    def snapshot(self):
+        out = self.stats.snapshot()
+        with self.metrics_lock:
+            if self.metrics.count:
+                out["metrics"] = self.metrics.result()
+        return out
+
+    def close(self):
+        self.batcher.close()
+
+def make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, so load generators reuse connections
+
+        def _send(self, code, obj):
+            body = json.dumps(obj).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/stats":
+                self._send(200, service.snapshot())
+            elif self.path == "/health":
+                self._send(200, {"ok": True, "pipeline": service.pipeline, "img_size": list(service.img_size)})
+            else:
+                self._send(404, {"error": "not found"})
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            data = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if url.path != "/predict":
+                self._send(404, {"error": "not found"})
+                return
+            try:
+                label = parse_qs(url.query).get("label", [None])[0]
+                label = service.parse_label(label) if label is not None else None
+                self._send(200, service.predict_bytes(data, label))
+            except ValueError as e:
+                self._send(400, {"error": str(e)})
+            except Exception as e:
+                self._send(500, {"error": f"{type(e).__name__}: {e}"})
+
+        def log_message(self, *args):
+            pass  # per-request logging would dominate at high request rates
+    return Handler
+
+class Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256  # socketserver's default backlog of 5 resets connections under bursts
+
+def serve(service, host="127.0.0.1", port=8500):
+    server = Server((host, port), make_handler(service))
+    signal.signal(signal.SIGTERM, signal.default_int_handler)  # SIGTERM shuts down like Ctrl-C
+    print(f"Serving on http://{host}:{port} (pipeline={service.pipeline}, img_size={service.img_size}, "
+          f"max_batch={service.batcher.max_batch}, max_wait={service.batcher.max_wait * 1e3:.1f}ms)", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+        print(json.dumps(service.snapshot(), indent=2))
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--model", default="models/baseline_cancernet.h5", help=".h5 model or quantized .tflite (src/models/quantize.py)")
+    ap.add_argument("--backend", choices=BACKENDS, default="auto", help="keras | tflite; auto picks by file extension")
+    ap.add_argument("--num_threads", type=int, default=None, help="TFLite interpreter threads")
+    ap.add_argument("--pipeline", default=None, help="PIPELINES name or spec applied before resizing (as the model was trained)")
+    ap.add_argument("--img_size", type=int, nargs=2, default=[128,128])
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8500)
+    ap.add_argument("--max_batch", type=int, default=32, help="largest micro-batch per model call")
+    ap.add_argument("--max_wait_ms", type=float, default=5.0, help="how long the first request in a batch waits for company")
+    ap.add_argument("--cv_threads", type=int, default=1, help="OpenCV threads; request threads already run preprocessing in parallel")
+    args = ap.parse_args()
+    if args.pipeline:
+        parse_spec(args.pipeline)  # fail fast on a bad spec
+    init_worker(args.cv_threads)
+    service = InferenceService(load_inference_model(args.model, args.backend, args.num_threads), args.pipeline, args.img_size, args.max_batch, args.max_wait_ms)
+    serve(service, args.host, args.port)
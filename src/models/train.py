@@ -1,33 +1,126 @@
 import os
 import sys
-from cancer_net import build_cancer_net
+import json
+import time
+import argparse
 from keras.preprocessing.image import ImageDataGenerator  
-from keras.callbacks import EarlyStopping, ModelCheckpoint  
-
-def train_model(train_dir, val_dir, save_path):
-    datagen = ImageDataGenerator(rescale=1./255)
-    train_gen = datagen.flow_from_directory(
-        train_dir, 
-        target_size=(128,128), 
-        color_mode='grayscale', 
-        batch_size=32,
-        class_mode='categorical'
-    )
-    val_gen = datagen.flow_from_directory(
-        val_dir, 
-        target_size=(128,128), 
-        color_mode='grayscale', 
-        batch_size=32,
-        class_mode='categorical'
-    )
-    model = build_cancer_net()
+from keras.callbacks import Callback, EarlyStopping, ModelCheckpoint  
+
+# Ensure repo root on path when running as a script
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from src.models.cancer_net import build_cancer_net
+from src.utils.shards import ShardSequence
+from src.utils.tensor_cache import MemmapSequence
+
+PRECISIONS = ("float32", "mixed_bfloat16")
+
+def configure_runtime(precision="float32", intra_op=None, inter_op=None):
+    """
+    Global TF settings for training; call before the first op runs (threading
+    can't change once the runtime is up). precision='mixed_bfloat16' computes
+    in bfloat16 with float32 variables, which only pays off on CPUs with
+    native bf16 (AVX512_BF16 / AMX); elsewhere it is emulated and slower.
+    intra_op/inter_op: TF op thread pools (None/0 = TF's default, all cores).
+    """
+    import tensorflow as tf
+    from keras import mixed_precision
+    if intra_op:
+        tf.config.threading.set_intra_op_parallelism_threads(intra_op)
+    if inter_op:
+        tf.config.threading.set_inter_op_parallelism_threads(inter_op)
+    mixed_precision.set_global_policy(precision)
+    return {"precision": precision, "intra_op": tf.config.threading.get_intra_op_parallelism_threads(),
+            "inter_op": tf.config.threading.get_inter_op_parallelism_threads()}
+
+class EpochTimer(Callback):
+    """Wall/CPU seconds and logs per epoch, rewritten to `path` (JSON) after every epoch."""
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self.epochs = []
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._start = (time.time(), time.perf_counter(), time.process_time())
+
+    def on_epoch_end(self, epoch, logs=None):
+        start, t, cpu = self._start
+        row = {"epoch": epoch + 1, "start": start, "wall_s": time.perf_counter() - t, "cpu_s": time.process_time() - cpu}
+        row.update({k: float(v) for k, v in (logs or {}).items()})
+        self.epochs.append(row)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "w") as f:
+            json.dump(self.epochs, f, indent=2)
+
+def train_model(train_dir, val_dir, save_path, shards_dir=None, cache_dir=None, input_backend="keras", manifest=None,
+                epoch_log=None, jit_compile=False):
+    if manifest:
+        # split written by a SplitWriter; in 'virtual' mode the paths point straight at the sources
+        from src.utils.data_loader import make_manifest_generator
+        if input_backend == "tfdata":
+            from src.utils.tf_input import make_dataset_from_manifest
+            train_gen, _, _ = make_dataset_from_manifest(manifest, "train", img_size=(128,128), batch_size=32, shuffle=True)
+            val_gen, _, _ = make_dataset_from_manifest(manifest, "val", img_size=(128,128), batch_size=32, shuffle=False)
+        else:
+            train_gen = make_manifest_generator(manifest, "train", batch_size=32, img_size=(128,128))
+            val_gen = make_manifest_generator(manifest, "val", batch_size=32, img_size=(128,128), shuffle=False)
+    elif cache_dir:
+        # one-time materialized memmap from src/utils/tensor_cache.py; epochs are memory-bound
+        train_gen = MemmapSequence(cache_dir, "train", batch_size=32, shuffle=True)
+        val_gen = MemmapSequence(cache_dir, "val", batch_size=32, shuffle=False)
+    elif shards_dir:
+        # pre-resized uint8 shards from src/utils/shards.py; no per-epoch decoding
+        train_gen = ShardSequence(shards_dir, "train", batch_size=32, shuffle=True)
+        val_gen = ShardSequence(shards_dir, "val", batch_size=32, shuffle=False)
+    elif input_backend == "tfdata":
+        # parallel decode/resize on tf.data threads, cached after the first epoch
+        from src.utils.tf_input import make_dataset
+        train_gen, class_indices, _ = make_dataset(train_dir, img_size=(128,128), batch_size=32, shuffle=True)
+        val_gen, _, _ = make_dataset(val_dir, img_size=(128,128), batch_size=32, shuffle=False)
+        print("Class indices:", class_indices)
+    else:
+        datagen = ImageDataGenerator(rescale=1./255)
+        train_gen = datagen.flow_from_directory(
+            train_dir, 
+            target_size=(128,128), 
+            color_mode='grayscale', 
+            batch_size=32,
+            class_mode='categorical'
+        )
+        val_gen = datagen.flow_from_directory(
+            val_dir, 
+            target_size=(128,128), 
+            color_mode='grayscale', 
+            batch_size=32,
+            class_mode='categorical'
+        )
+    model = build_cancer_net(jit_compile=jit_compile)
     callbacks = [
         EarlyStopping(monitor='val_loss', patience=8, restore_best_weights=True), 
         ModelCheckpoint(save_path, save_best_only=True)
     ]
+    if epoch_log:
+        callbacks.append(EpochTimer(epoch_log))
     model.fit(train_gen, validation_data=val_gen, epochs=15, callbacks=callbacks)
     return model
 
 if __name__ == "__main__":
-    train_model("data/train/", "data/val/", "models/baseline_cancernet.h5")
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--train_dir", default="data/train/")
+    ap.add_argument("--val_dir", default="data/val/")
+    ap.add_argument("--save_path", default="models/baseline_cancernet.h5")
+    ap.add_argument("--shards", default=None, help="read packed shards from this dir instead of the image folders")
+    ap.add_argument("--tensor_cache", default=None, help="read the 128x128 memmap tensor cache from this dir")
+    ap.add_argument("--input_backend", choices=["keras", "tfdata"], default="keras",
+                    help="image-folder reader: legacy ImageDataGenerator or a prefetching tf.data pipeline")
+    ap.add_argument("--manifest", default=None, help="split manifest CSV (e.g. data/split_manifest.csv) instead of the image folders")
+    ap.add_argument("--epoch_log", default=None, help="write per-epoch wall/CPU time and metrics to this JSON file")
+    ap.add_argument("--jit_compile", action="store_true", help="XLA-compile the train/predict steps")
+    ap.add_argument("--precision", choices=PRECISIONS, default="float32", help="mixed_bfloat16 needs native bf16 on the CPU to help")
+    ap.add_argument("--intra_op", type=int, default=0, help="TF threads per op (0 = TF default)")
+    ap.add_argument("--inter_op", type=int, default=0, help="TF ops run concurrently (0 = TF default)")
+    args = ap.parse_args()
+    print("Runtime:", configure_runtime(args.precision, args.intra_op, args.inter_op))
+    train_model(args.train_dir, args.val_dir, args.save_path, shards_dir=args.shards, cache_dir=args.tensor_cache,
+                input_backend=args.input_backend, manifest=args.manifest, epoch_log=args.epoch_log,
+                jit_compile=args.jit_compile)
 
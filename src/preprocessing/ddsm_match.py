@@ -0,0 +1,138 @@
+import os, re
+import pandas as pd
+
+# Shared CBIS-DDSM description-CSV matching for the sort/split scripts.
+# Everything is done with vectorized Series.str ops and merges; no iterrows.
+
+UID_RE = r"(1\.3\.6(?:\.\d+){5,})"  # matches 1.3.6.1.4.1.9590... style UID
+PATIENT_RE = r"(P_\d{5})"
+LABEL_COLS = ["pathology", "Pathology", "label", "Label"]
+LABELS = ["benign", "malignant"]
+
+def read_descriptions(csv_files):
+    """All description CSVs in one frame, with a `csv` source column and a normalized `label`."""
+    frames = []
+    for path in csv_files:
+        if not os.path.exists(path):
+            print("Missing CSV:", path)
+            continue
+        df = pd.read_csv(path)
+        df["csv"] = os.path.basename(path)
+        frames.append(df)
+    if not frames:
+        return pd.DataFrame(columns=["csv", "label"])
+    df = pd.concat(frames, ignore_index=True)
+    df["label"] = labels(df)
+    return df
+
+def labels(df):
+    # First of LABEL_COLS holding benign/malignant wins, as in the old per-row get_label
+    out = pd.Series(pd.NA, index=df.index, dtype="object")
+    for c in LABEL_COLS:
+        if c in df:
+            v = df[c].astype("string").str.strip().str.lower()
+            out = out.mask(out.isna() & v.isin(LABELS), v)
+    return out
+
+def path_columns(df, exact_suffix=False):
+    """Path-like columns: any name containing 'path', or (exact_suffix) '... file path' / '...path' only."""
+    if exact_suffix:
+        return [c for c in df.columns if "file path" in c.lower() or c.lower().endswith("path")]
+    return [c for c in df.columns if "path" in c.lower()]
+
+def _clean(s):
+    return s.astype("string").str.strip().str.replace("\\", "/", regex=False)
+
+def uid_matches(df, path_cols):
+    """Long frame (row, col, n, uid): every UID in every path column, ordered by column then position."""
+    parts = []
+    for i, c in enumerate(path_cols):
+        if c not in df:
+            continue
+        m = _clean(df[c]).str.extractall(UID_RE)
+        if m.empty:
+            continue
+        m.index = m.index.set_names(["row", "n"])
+        m = m.reset_index().rename(columns={0: "uid"})
+        m["col"] = i
+        parts.append(m)
+    if not parts:
+        return pd.DataFrame(columns=["row", "col", "n", "uid"])
+    return pd.concat(parts, ignore_index=True).sort_values(["row", "col", "n"], kind="stable")
+
+def last_uid(df, path_cols):
+    """Per row: the last UID of the first path column that contains one (NaN when none)."""
+    m = uid_matches(df, path_cols)
+    m = m[m["col"] == m.groupby("row")["col"].transform("min")]
+    return m.groupby("row")["uid"].last().str.lower().reindex(df.index)
+
+def patient_ids(df, path_cols):
+    if not path_cols:
+        return pd.Series(pd.NA, index=df.index, dtype="object")
+    joined = df[path_cols].astype("string").fillna("").agg(" ".join, axis=1)
+    return joined.str.extract(PATIENT_RE, flags=re.IGNORECASE, expand=False).str.upper()
+
+def patient_labels(df, path_cols):
+    """{patient id: label}; later rows override earlier ones like the old dict loop."""
+    pid = patient_ids(df, path_cols)
+    ok = df["label"].isin(LABELS) & pid.notna()
+    return dict(zip(pid[ok], df.loc[ok, "label"]))
+
+def filename_labels(df, col="image file path"):
+    """{<last path component>.jpg: label} for rows with a benign/malignant pathology."""
+    if col not in df:
+        return {}
+    ok = df["label"].isin(LABELS) & df[col].notna()
+    names = df.loc[ok, col].astype(str).str.split("/").str[-1].str.replace(".dcm", ".jpg", regex=False)
+    return dict(zip(names, df.loc[ok, "label"]))
+
+# -------- File indexes --------
+
+def uid_file_index(files):
+    """(uid, path): every UID-like substring of each file *name*, first path per UID (files: DataFrame with a path column)."""
+    names = files["path"].map(os.path.basename).str.lower()
+    m = names.str.extractall(UID_RE)
+    if m.empty:
+        return pd.DataFrame(columns=["uid", "path"])
+    m = m.reset_index(level=1, drop=True).rename(columns={0: "uid"})
+    m["path"] = files["path"].reindex(m.index).to_numpy()
+    return m.drop_duplicates("uid").reset_index(drop=True)
+
+def uid_folder_index(files, root):
+    """
+    (uid, path) for images in <root>/<UID>/ or one level below: direct files win,
+    preferring 000000.* / 000001.*, otherwise the first file of a sub-folder.
+    """
+    rel = files["path"].map(lambda p: os.path.relpath(p, root)).str.split(os.sep)
+    depth = rel.str.len()
+    df = pd.DataFrame({"uid": rel.str[0], "path": files["path"], "depth": depth})
+    df = df[df["depth"].isin([2, 3])]
+    stem = df["path"].map(lambda p: os.path.splitext(os.path.basename(p))[0])
+    df["rank"] = (df["depth"] - 2) * 2 + (~stem.isin(["000000", "000001"]) | (df["depth"] == 3)).astype(int)
+    return df.sort_values(["uid", "rank", "path"], kind="stable").drop_duplicates("uid")[["uid", "path"]]
+
+# -------- Matching --------
+
+def match_by_uid(df, path_cols, uid_paths):
+    """
+    Join each row's UIDs (all path columns, in order) against a (uid, path)
+    index; the first UID with a file wins. Returns (matched, unmatched) where
+    matched has the row index plus uid and path columns.
+    """
+    m = uid_matches(df, path_cols).merge(uid_paths, on="uid", how="inner")
+    m = m.sort_values(["row", "col", "n"], kind="stable").drop_duplicates("row").set_index("row")
+    matched = df.loc[m.index].assign(uid=m["uid"], path=m["path"])
+    unmatched = df.drop(index=m.index)
+    return matched, unmatched
+
+def match_last_uid(df, path_cols, uid_paths):
+    """
+    Match on the last UID of the first path column with one (UID folder layout).
+    Returns (matched, unmatched); unmatched carries uid and a `reason` column.
+    """
+    uid = last_uid(df, path_cols)
+    out = df.assign(uid=uid).merge(uid_paths, on="uid", how="left").set_index(df.index)
+    matched = out[out["path"].notna()]
+    unmatched = out[out["path"].isna()].copy()
+    unmatched["reason"] = unmatched["uid"].isna().map({True: "no_uid", False: "no_image_in_uid_folder"})
+    return matched, unmatched
@@ -1,18 +1,151 @@
-import os
+import os, sys, time, argparse
+import numpy as np
 import pydicom
 import cv2
+from concurrent.futures import ProcessPoolExecutor
 
-def dicom_to_png(dicom_path, png_path):
+try:
+    from pydicom.pixels import apply_modality_lut, apply_voi_lut
+except ImportError:  # pydicom < 3
+    from pydicom.pixel_data_handlers.util import apply_modality_lut, apply_voi_lut
+
+# Ensure repo root on path when running as a script
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from src.preprocessing.pipelines import THREAD_POLICIES, cv_threads_for, init_worker
+
+WINDOWS = ("minmax", "percentile", "voi")
+_ROWS = 256  # rows per LUT block, bounds the index temporaries np.take makes
+
+def _codes(dtype):
+    """Every value a <=16-bit pixel can take, in raw-code order (int16 viewed through uint16 codes)."""
+    if dtype == np.uint8:
+        return np.arange(256, dtype=np.uint8)
+    codes = np.arange(65536, dtype=np.uint16)
+    return codes.view(np.int16) if dtype == np.int16 else codes
+
+def _hist(arr):
+    # Code histogram without a full-size temporary (np.bincount would cast to int64)
+    raw = arr.view(np.uint16) if arr.dtype == np.int16 else arr
+    n = 256 if arr.dtype == np.uint8 else 65536
+    return cv2.calcHist([np.ascontiguousarray(raw)], [0], None, [n], [0, n]).ravel()
+
+def _to_u8(v, lo, hi):
+    scale = 255.0 / (hi - lo) if hi > lo else 0.0
+    return np.clip(np.rint((v - lo) * scale), 0, 255).astype(np.uint8)
+
+def window_lut(arr, ds=None, window="minmax", pct=(0.5, 99.5)):
+    """
+    uint8 LUT indexed by raw pixel code. Bounds come from the code histogram,
+    so the full-size image is only read, never copied or converted to float.
+    """
+    values = _codes(arr.dtype)
+    hist = _hist(arr)
+    present = hist > 0
+    if window == "voi":
+        v = apply_voi_lut(apply_modality_lut(values, ds), ds).astype(np.float64)
+        lut = _to_u8(v, v[present].min(), v[present].max())
+        if getattr(ds, "PhotometricInterpretation", "") == "MONOCHROME1":
+            lut = 255 - lut
+        return lut
+    if window == "percentile":
+        order = np.argsort(values, kind="stable")
+        cum = np.cumsum(hist[order])
+        lo, hi = (values[order][min(np.searchsorted(cum, p / 100.0 * cum[-1]), len(cum) - 1)] for p in pct)
+        return _to_u8(values.astype(np.float64), float(lo), float(hi))
+    # minmax: cv2.normalize over the codes present in the image, so the result is
+    # bit-identical to the old cv2.normalize(pixel_array, ...).astype('uint8')
+    lut = cv2.normalize(values.reshape(1, -1), None, 0, 255, cv2.NORM_MINMAX, mask=present.astype(np.uint8).reshape(1, -1))
+    return lut.ravel().astype(np.uint8)
+
+def apply_lut(arr, lut):
+    if arr.dtype == np.uint8:
+        return cv2.LUT(arr, lut)
+    raw = arr.view(np.uint16) if arr.dtype == np.int16 else arr
+    out = np.empty(arr.shape, dtype=np.uint8)
+    for r in range(0, arr.shape[0], _ROWS):
+        np.take(lut, raw[r:r + _ROWS], out=out[r:r + _ROWS])
+    return out
+
+def downscale(arr, max_dim):
+    # Done straight after decode so windowing and PNG encoding run at the target size
+    h, w = arr.shape[:2]
+    if not max_dim or max(h, w) <= max_dim:
+        return arr
+    s = max_dim / max(h, w)
+    return cv2.resize(arr, (max(1, round(w * s)), max(1, round(h * s))), interpolation=cv2.INTER_AREA)
+
+def to_uint8(arr, ds=None, window="minmax", pct=(0.5, 99.5)):
+    if arr.dtype not in (np.uint8, np.uint16, np.int16):
+        # rare >16-bit data: plain vectorized path
+        v = apply_voi_lut(apply_modality_lut(arr, ds), ds) if window == "voi" else arr
+        lo, hi = (np.percentile(v, pct) if window == "percentile" else (v.min(), v.max()))
+        return _to_u8(v.astype(np.float64), float(lo), float(hi))
+    return apply_lut(arr, window_lut(arr, ds, window, pct))
+
+def dicom_to_png(dicom_path, png_path, window="minmax", max_dim=None, pct=(0.5, 99.5)):
     ds = pydicom.dcmread(dicom_path)
-    img = ds.pixel_array
-    norm_img = cv2.normalize(img, None, 0, 255, cv2.NORM_MINMAX)
-    cv2.imwrite(png_path, norm_img.astype('uint8'))
+    img = downscale(ds.pixel_array, max_dim)
+    out = to_uint8(img, ds, window, pct)
+    stem, ext = os.path.splitext(png_path)
+    tmp = stem + ".tmp" + ext  # atomic: an interrupted run never leaves a half-written PNG
+    cv2.imwrite(tmp, out)
+    os.replace(tmp, png_path)
+
+def _convert(job):
+    src, dst, window, max_dim, pct = job
+    try:
+        dicom_to_png(src, dst, window, max_dim, pct)
+        return None
+    except Exception as e:
+        return f"{src}: {e}"
+
+def list_jobs(input_dir, output_dir, overwrite=False):
+    """(src, dst) for every .dcm under input_dir, mirroring sub-folders; existing PNGs are skipped unless overwrite."""
+    jobs, skipped = [], 0
+    for root, _, files in os.walk(input_dir):
+        for fname in sorted(files):
+            if not fname.lower().endswith('.dcm'):
+                continue
+            rel = os.path.relpath(os.path.join(root, fname[:-4] + '.png'), input_dir)
+            dst = os.path.join(output_dir, rel)
+            if not overwrite and os.path.exists(dst):
+                skipped += 1
+                continue
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            jobs.append((os.path.join(root, fname), dst))
+    return jobs, skipped
 
-def batch_convert(input_dir, output_dir):
+def batch_convert(input_dir, output_dir, workers=1, window="minmax", max_dim=None, pct=(0.5, 99.5),
+                  overwrite=False, chunk_size=8, threads="pool"):
     os.makedirs(output_dir, exist_ok=True)
-    for fname in os.listdir(input_dir):
-        if fname.lower().endswith('.dcm'):
-            dicom_to_png(os.path.join(input_dir, fname), os.path.join(output_dir, fname.replace('.dcm','.png')))
+    jobs, skipped = list_jobs(input_dir, output_dir, overwrite)
+    jobs = [(src, dst, window, max_dim, tuple(pct)) for src, dst in jobs]
+    t0 = time.perf_counter()
+    cv_threads = cv_threads_for(workers, threads)  # see pipelines.THREAD_POLICIES
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(cv_threads,)) as ex:
+            errors = [e for e in ex.map(_convert, jobs, chunksize=chunk_size) if e]
+    else:
+        init_worker(cv_threads)
+        errors = [e for e in map(_convert, jobs) if e]
+    elapsed = time.perf_counter() - t0
+    for e in errors:
+        print("Failed:", e)
+    print(f"Converted {len(jobs) - len(errors)} | skipped (exists) {skipped} | failed {len(errors)} "
+          f"in {elapsed:.1f}s ({len(jobs) / max(elapsed, 1e-9):.1f} files/s, {workers} workers x {cv_threads} OpenCV threads)")
 
 if __name__ == "__main__":
-    batch_convert("data/raw/", "data/preprocessed/")
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--input_dir", default="data/raw/")
+    ap.add_argument("--output_dir", default="data/preprocessed/")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--window", choices=WINDOWS, default="minmax",
+                    help="minmax (old behaviour), percentile clip, or the VOI LUT / window from the DICOM header")
+    ap.add_argument("--pct", type=float, nargs=2, default=[0.5, 99.5], help="percentiles for --window percentile")
+    ap.add_argument("--max_dim", type=int, default=None, help="downscale so the longer side is at most this")
+    ap.add_argument("--overwrite", action="store_true", help="reconvert files whose PNG already exists")
+    ap.add_argument("--thread_policy", choices=THREAD_POLICIES, default="pool",
+                    help="pool: 1 OpenCV thread per worker; opencv: all cores to OpenCV; split: cores divided between them")
+    args = ap.parse_args()
+    batch_convert(args.input_dir, args.output_dir, args.workers, args.window, args.max_dim, args.pct, args.overwrite,
+                  threads=args.thread_policy)
@@ -0,0 +1,181 @@
+import ast, re, inspect
+from src.preprocessing import pipelines as _pipelines
+
+# -------- Stage registry --------
+# A stage maps a single-channel uint8 image to a new one. Stages flagged
+# inplace=True may write their result into their input buffer (dst=g); the
+# executor only hands them a buffer to overwrite when nothing else needs it,
+# so no defensive copies are ever taken.
+
+class Stage:
+    def __init__(self, name, fn, inplace):
+        self.name = name
+        self.fn = fn
+        self.inplace = inplace
+        # parameters after (g, dst) are the tunable ones
+        self.defaults = {k: p.default for k, p in list(inspect.signature(fn).parameters.items())[2:]}
+
+STAGES = {}
+
+def stage(name, inplace=False):
+    def register(fn):
+        STAGES[name] = Stage(name, fn, inplace)
+        return fn
+    return register
+
+# Stages are thin adapters over the functions in pipelines.py, the single
+# implementation that PIPELINES and BATCH_PIPELINES use too.
+
+@stage("bilateral")
+def _bilateral(g, dst=None, d=7, sigmaColor=50, sigmaSpace=50):
+    return _pipelines.bilateral(g, d, sigmaColor, sigmaSpace, dst=dst)
+
+@stage("clahe")
+def _clahe(g, dst=None, clip=2.0, tile=(8,8)):
+    return _pipelines.clahe(g, clip, tile, dst=dst)
+
+@stage("hist_eq", inplace=True)
+def _hist_eq(g, dst=None):
+    return _pipelines.hist_eq(g, dst=dst)
+
+@stage("unsharp", inplace=True)
+def _unsharp(g, dst=None, k=1.0):
+    return _pipelines.unsharp(g, k, dst=dst)
+
+@stage("median")
+def _median(g, dst=None, k=3):
+    return _pipelines.median(g, k, dst=dst)
+
+@stage("nlm")
+def _nlm(g, dst=None, h=10):
+    return _pipelines.nlm(g, h, dst=dst)
+
+@stage("gamma", inplace=True)
+def _gamma(g, dst=None, gamma=1.0):
+    return _pipelines.gamma(g, gamma, dst=dst)
+
+@stage("wiener")
+def _wiener(g, dst=None, ksize=7, K=0.01):
+    return _pipelines.wiener(g, ksize=ksize, K=K, dst=dst)
+
+@stage("gaussian")
+def _gaussian(g, dst=None, ksize=5, sigma=0):
+    return _pipelines.gaussian(g, ksize=ksize, sigma=sigma, dst=dst)
+
+# Named entries of PIPELINES expressed as specs (same output, byte for byte)
+PIPELINE_SPECS = {
+    "bilateral": "bilateral",
+    "clahe": "clahe",
+    "hist_eq": "hist_eq",
+    "unsharp": "unsharp",
+    "median": "median",
+    "nlm": "nlm",
+    "gamma_08": "gamma(gamma=0.8)",
+    "gamma_12": "gamma(gamma=1.2)",
+    "wiener": "wiener",
+    "histeq_median": "hist_eq|median(k=3)",
+    "gaussian": "gaussian",
+}
+
+# -------- Spec parsing --------
+
+_STEP_RE = re.compile(r"^\s*(\w+)\s*(?:\((.*)\))?\s*$", re.S)
+
+def parse_spec(spec):
+    """
+    "hist_eq|median(k=3)" -> (("hist_eq", ()), ("median", (("k", 3),)))
+    Unspecified parameters are filled from the stage defaults so equivalent
+    specs normalize to the same key. Named PIPELINES entries are accepted too.
+    """
+    spec = PIPELINE_SPECS.get(spec, spec)
+    steps = []
+    for part in spec.split("|"):
+        m = _STEP_RE.match(part)
+        if not m:
+            raise ValueError(f"Bad pipeline step: {part!r} in {spec!r}")
+        name, argstr = m.group(1), m.group(2)
+        if name == "gray":
+            continue  # implicit root of every pipeline
+        if name not in STAGES:
+            raise ValueError(f"Unknown stage: {name} (choose from {', '.join(STAGES)})")
+        params = dict(STAGES[name].defaults)
+        if argstr and argstr.strip():
+            call = ast.parse(f"f({argstr})", mode="eval").body
+            if call.args:
+                raise ValueError(f"Stage parameters must be keyword arguments: {part!r}")
+            for kw in call.keywords:
+                if kw.arg not in params:
+                    raise ValueError(f"Unknown parameter {kw.arg!r} for stage {name}")
+                params[kw.arg] = ast.literal_eval(kw.value)
+        steps.append((name, tuple(sorted(params.items()))))
+    return tuple(steps)
+
+def format_spec(steps):
+    parts = []
+    for name, params in steps:
+        args = ",".join(f"{k}={v!r}" for k, v in params)
+        parts.append(f"{name}({args})" if args else name)
+    return "|".join(parts)
+
+def spec_dirname(spec):
+    """Directory name for an output tree: PIPELINES names stay as-is, specs are sanitized."""
+    if spec in PIPELINE_SPECS:
+        return spec
+    return re.sub(r"[^\w.=,-]+", "_", spec.replace("|", "+")).strip("_")
+
+# -------- Graph executor --------
+
+def to_gray_u8(img):
+    return _pipelines._ensure_u8_gray(img)
+
+class _Node:
+    __slots__ = ("step", "children", "outputs")
+    def __init__(self, step):
+        self.step = step
+        self.children = {}
+        self.outputs = []
+
+class PipelineGraph:
+    """
+    Prefix tree over several specs. Each image is converted to gray once and
+    every shared prefix (e.g. hist_eq in "hist_eq" and "hist_eq|median") is
+    computed once; run() returns {spec: output}.
+    """
+    def __init__(self, specs):
+        self.specs = list(specs)
+        self.root = _Node(None)
+        for spec in self.specs:
+            node = self.root
+            for step in parse_spec(spec):
+                node = node.children.setdefault(step, _Node(step))
+            node.outputs.append(spec)
+
+    def run(self, img):
+        g = to_gray_u8(img)
+        results = {}
+        if g is None:
+            return {spec: None for spec in self.specs}
+        # the caller's array is never written to; a converted copy is ours to reuse
+        self._visit(self.root, g, owned=g is not img, results=results)
+        return results
+
+    def _visit(self, node, buf, owned, results):
+        for spec in node.outputs:
+            results[spec] = buf
+        owned = owned and not node.outputs  # emitted buffers must stay intact
+        children = list(node.children.values())
+        for i, child in enumerate(children):
+            name, params = child.step
+            st = STAGES[name]
+            if buf is None:
+                self._visit(child, None, False, results)
+                continue
+            donate = owned and st.inplace and i == len(children) - 1
+            out = st.fn(buf, buf if donate else None, **dict(params))
+            child_owned = out is not buf or donate
+            self._visit(child, out, child_owned, results)
+
+def compile_spec(spec):
+    """Single-image callable for a spec, usable wherever a PIPELINES function is."""
+    graph = PipelineGraph([spec])
+    return lambda img: graph.run(img)[spec]
@@ -1,5 +1,7 @@
+import os, threading
 import cv2
 import numpy as np
+from collections import OrderedDict
 
 def _to_gray_u8(img):
     # Ensures single-channel uint8 without using .astype on None
@@ -17,64 +19,169 @@ def to_gray(img):
         return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
     return img
 
-def clip_01(x):
-    x = np.clip(x, 0, 255).astype(np.uint8)
-    return x
+def clip_01(x, dst=None):
+    # Only converts when needed: OpenCV results are already uint8 and pass through
+    # without a copy. With dst, the result ends up in dst.
+    if x.dtype == np.uint8:
+        if dst is not None and x is not dst and x.shape == dst.shape:
+            np.copyto(dst, x)
+            return dst
+        return x
+    if dst is not None and dst.shape == x.shape:
+        np.copyto(dst, np.clip(x, 0, 255), casting="unsafe")
+        return dst
+    return np.clip(x, 0, 255).astype(np.uint8)
 
-def bilateral(img, d=7, sigmaColor=50, sigmaSpace=50):
+# -------- Output buffers --------
+
+class BufferPool:
+    """
+    Free list of flat uint8 buffers handed out as reshaped views. Full-field
+    mammograms rarely share an exact shape, so any free buffer big enough is
+    reused (best fit) and new ones are rounded up to 1 MiB to fit the next
+    image too. One pool per process (BUFFERS), shared by its threads (e.g.
+    serve.py's request threads), so the free list is only touched under a
+    lock; take() a dst, give() it back once the result has been written out.
+    """
+    def __init__(self, max_bytes=512 << 20, round_to=1 << 20):
+        self.max_bytes = max_bytes
+        self.round_to = round_to
+        self.bytes = 0
+        self._free = []
+        self._lock = threading.Lock()
+
+    def take(self, shape):
+        need = int(np.prod(shape))
+        with self._lock:
+            fits = [b for b in self._free if b.nbytes >= need]
+            buf = min(fits, key=lambda b: b.nbytes) if fits else None
+            if buf is not None:
+                self._free = [b for b in self._free if b is not buf]
+                self.bytes -= buf.nbytes
+        if buf is None:
+            buf = np.empty(-(-max(need, 1) // self.round_to) * self.round_to, dtype=np.uint8)
+        return buf[:need].reshape(shape)
+
+    def give(self, *arrays):
+        with self._lock:
+            for a in arrays:
+                base = a.base if a is not None and a.base is not None else a
+                if base is None or base.dtype != np.uint8 or base.ndim != 1:
+                    continue
+                if any(b is base for b in self._free) or self.bytes + base.nbytes > self.max_bytes:
+                    continue
+                self._free.append(base)
+                self.bytes += base.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._free = []
+            self.bytes = 0
+
+BUFFERS = BufferPool()
+
+# -------- OpenCV state and threading --------
+# Stateful OpenCV objects (CLAHE) are not safe to share between threads, so
+# configured instances live in a per-thread registry; module state makes it
+# per-process too. They are built once per parameter set, not per image.
+
+_CV_LOCAL = threading.local()
+
+def clahe_for(clip=2.0, tile=(8,8)):
+    """This thread's cv2.CLAHE configured with (clip, tile)."""
+    registry = getattr(_CV_LOCAL, "clahe", None)
+    if registry is None:
+        registry = _CV_LOCAL.clahe = {}
+    key = (float(clip), (int(tile[0]), int(tile[1])))
+    obj = registry.get(key)
+    if obj is None:
+        obj = registry[key] = cv2.createCLAHE(clipLimit=key[0], tileGridSize=key[1])
+    return obj
+
+# Who parallelizes: "pool" = our worker pool, one OpenCV thread per worker;
+# "opencv" = OpenCV's internal threads use every core (for a single worker);
+# "split" = cores divided between workers and OpenCV threads.
+THREAD_POLICIES = ("pool", "opencv", "split")
+
+def cv_threads_for(workers, policy="pool"):
+    """OpenCV threads per worker process for `workers` workers under `policy`."""
+    if policy not in THREAD_POLICIES:
+        raise ValueError(f"unknown thread policy {policy!r} (choose from {', '.join(THREAD_POLICIES)})")
+    cores = os.cpu_count() or 1
+    if policy == "opencv" or workers <= 1:
+        return cores
+    if policy == "split":
+        return max(1, cores // workers)
+    return 1
+
+def init_worker(cv_threads=1):
+    """Pool initializer: fix OpenCV's thread count once per worker process."""
+    cv2.setNumThreads(cv_threads)
+
+# -------- Single-image pipelines --------
+# Each takes an optional dst: a uint8 array of the output shape to write into
+# (e.g. from BUFFERS). dst must not alias img.
+
+def bilateral(img, d=7, sigmaColor=50, sigmaSpace=50, dst=None):
     g = to_gray(img)
-    out = cv2.bilateralFilter(g, d=d, sigmaColor=sigmaColor, sigmaSpace=sigmaSpace)
-    return clip_01(out)
+    out = cv2.bilateralFilter(g, d=d, sigmaColor=sigmaColor, sigmaSpace=sigmaSpace, dst=dst)
+    return clip_01(out, dst)
 
-def clahe(img, clip=2.0, tile=(8,8)):
+def clahe(img, clip=2.0, tile=(8,8), dst=None):
     g = to_gray(img)
-    clahe_obj = cv2.createCLAHE(clipLimit=clip, tileGridSize=tile)
-    out = clahe_obj.apply(g)
-    return clip_01(out)
+    out = clahe_for(clip, tile).apply(g, dst)
+    return clip_01(out, dst)
 
-def hist_eq(img):
+def hist_eq(img, dst=None):
     g = to_gray(img)
-    out = cv2.equalizeHist(g)
-    return clip_01(out)
+    out = cv2.equalizeHist(g, dst)
+    return clip_01(out, dst)
 
-def unsharp(img, k=1.0):
+def unsharp(img, k=1.0, dst=None):
     g = to_gray(img)
     blur = cv2.GaussianBlur(g, (0,0), 2.0)
-    out = cv2.addWeighted(g, 1+k, blur, -k, 0)
-    return clip_01(out)
+    out = cv2.addWeighted(g, 1+k, blur, -k, 0, dst)
+    return clip_01(out, dst)
 
-def median(img, k=3):
+def median(img, k=3, dst=None):
     g = to_gray(img)
-    out = cv2.medianBlur(g, k)
-    return clip_01(out)
+    out = cv2.medianBlur(g, k, dst)
+    return clip_01(out, dst)
 
-def nlm(img, h=10):
+def nlm(img, h=10, dst=None):
     g = to_gray(img)
-    out = cv2.fastNlMeansDenoising(g, None, h, 7, 21)
-    return clip_01(out)
+    out = cv2.fastNlMeansDenoising(g, dst, h, 7, 21)
+    return clip_01(out, dst)
 
-_GAMMA08_LUT = np.array([((i / 255.0) ** 0.8) * 255.0 for i in range(256)], dtype=np.uint8)
-_GAMMA12_LUT = np.array([((i / 255.0) ** 1.2) * 255.0 for i in range(256)], dtype=np.uint8)
+_GAMMA_LUTS = {}
+
+def gamma_lut(gamma):
+    """256-entry uint8 LUT for x -> 255 * (x/255)**gamma, built once per gamma."""
+    lut = _GAMMA_LUTS.get(gamma)
+    if lut is None:
+        lut = _GAMMA_LUTS[gamma] = np.array([((i / 255.0) ** gamma) * 255.0 for i in range(256)], dtype=np.uint8)
+    return lut
+
+def gamma(img, gamma=1.0, dst=None):
+    """Gamma correction through a precomputed LUT; gamma < 1 brightens, > 1 darkens."""
+    g = _to_gray_u8(img)
+    if g is None:
+        return None
+    return cv2.LUT(g, gamma_lut(gamma), dst)
 
-def gamma_08(img):
+def gamma_08(img, dst=None):
     """
     Gamma correction with gamma=0.8 using a precomputed LUT.
     Brightens image. Robust to dtype and channels.
     """
-    g = _to_gray_u8(img)
-    if g is None:
-        return None
-    return cv2.LUT(g, _GAMMA08_LUT)
+    return gamma(img, 0.8, dst)
 
-def gamma_12(img):
+def gamma_12(img, dst=None):
     """
     Gamma correction with gamma=1.2 using a precomputed LUT.
     Darkens image.
     """
-    g = _to_gray_u8(img)
-    if g is None:
-        return None
-    return cv2.LUT(g, _GAMMA12_LUT)
+    return gamma(img, 1.2, dst)
 
 def _ensure_u8_gray(img):
     if img is None:
@@ -87,12 +194,126 @@ def _ensure_u8_gray(img):
 
 # -------- Wiener filter --------
 
-def wiener(img, ksize=7, K=0.01):
+_WIENER_GLOBAL_MAX = 1024  # above this the image is filtered in overlap-save tiles...
+_WIENER_MAX_MARGIN = 512   # ...unless K is so small the kernel outgrows this margin; then one global FFT
+
+class TransferCache:
+    """
+    LRU of precomputed frequency-domain transfer functions keyed by
+    (filter, shape, params), bounded by total bytes rather than entry count
+    (a 1024x1024 complex64 W is 8 MB; a thumbnail-sized one a few KB).
+    Thread-safe; a missing W is built outside the lock, so two threads may
+    both build it and the second insert is dropped.
+    """
+    def __init__(self, max_bytes=256 << 20):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, build):
+        with self._lock:
+            W = self._entries.get(key)
+            if W is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return W
+            self.misses += 1
+        W = build()
+        W.flags.writeable = False
+        with self._lock:
+            if key in self._entries:
+                return self._entries[key]
+            self._entries[key] = W
+            self.bytes += W.nbytes
+            while self.bytes > self.max_bytes and len(self._entries) > 1:
+                _, old = self._entries.popitem(last=False)
+                self.bytes -= old.nbytes
+        return W
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+TRANSFER_CACHE = TransferCache()
+
+def _wiener_transfer(shape, ksize, K, real=False):
+    """
+    Wiener transfer function W = conj(H) / (|H|^2 + K) of a centered box PSF
+    for an FFT of the given shape: the full fft2 spectrum, or with real=True
+    the rfft2 half-spectrum. Depends only on (shape, ksize, K), so it comes
+    from TRANSFER_CACHE instead of being rebuilt for every image.
+    """
+    shape = tuple(int(n) for n in shape)
+    return TRANSFER_CACHE.get(("wiener", shape, ksize, K, real), lambda: _build_wiener_transfer(shape, ksize, K, real))
+
+def _build_wiener_transfer(shape, ksize, K, real):
+    h, w = shape
+    psf = np.ones((ksize, ksize), np.float32)
+    psf /= psf.sum()
+    pad = np.zeros(shape, dtype=np.float32)
+    cy, cx = h // 2, w // 2
+    sy, sx = cy - ksize // 2, cx - ksize // 2
+    pad[sy:sy+ksize, sx:sx+ksize] = psf
+    pad = np.roll(pad, shift=(-cy, -cx), axis=(0, 1))  # center → origin
+    H = np.fft.rfft2(pad) if real else np.fft.fft2(pad)
+    return np.conj(H) / (np.abs(H)**2 + K)
+
+def _wiener_margin(ksize, K):
+    # The spatial Wiener kernel decays over roughly 2*ksize/sqrt(K) pixels; past
+    # that its tail contributes well under half a gray level.
+    return int(-(-2 * ksize / np.sqrt(K) // 16) * 16)
+
+def _wiener_use_tiles(shape, ksize, K):
+    # tiles only pay off (and only match the global FFT) while the margin stays small
+    return max(shape) > _WIENER_GLOBAL_MAX and _wiener_margin(ksize, K) <= _WIENER_MAX_MARGIN
+
+def _wiener_tiled(g_f, ksize, K):
+    """
+    Overlap-save: wrap-pad by the kernel margin (same circular model as the
+    global FFT), filter FFT-friendly tiles with one cached W, keep each core.
+    """
+    h, w = g_f.shape
+    m = _wiener_margin(ksize, K)
+    n = cv2.getOptimalDFTSize(max(1024, 4 * m))
+    core = n - 2 * m
+    ny, nx = -(-h // core), -(-w // core)
+    padded = cv2.copyMakeBorder(g_f, m, ny * core - h + m, m, nx * core - w + m, cv2.BORDER_WRAP)
+    W = _wiener_transfer((n, n), ksize, K, real=True)
+    out = np.empty((ny * core, nx * core), dtype=np.float32)
+    for ty in range(ny):
+        # one tile row at a time: a single batched rfft2 over a (nx, n, n) stack
+        band = padded[ty*core:ty*core+n]
+        tiles = np.stack([band[:, tx*core:tx*core+n] for tx in range(nx)])
+        f = np.fft.irfft2(np.fft.rfft2(tiles) * W, s=(n, n))
+        out[ty*core:(ty+1)*core] = f[:, m:m+core, m:m+core].transpose(1, 0, 2).reshape(core, nx * core)
+    return out[:h, :w]
+
+def _wiener_params(ksize, K):
+    # ensure odd, min 3
+    return int(max(3, ksize // 2 * 2 + 1)), max(float(K), 1e-6)
+
+def _wiener_u8(f_hat, dst=None):
+    # in place on the float result: no extra full-size float temporaries
+    np.clip(f_hat, 0.0, 1.0, out=f_hat)
+    f_hat *= 255.0
+    if dst is None or dst.shape != f_hat.shape:
+        return f_hat.astype(np.uint8)
+    np.copyto(dst, f_hat, casting="unsafe")
+    return dst
+
+def wiener(img, ksize=7, K=0.01, dst=None):
     """
     Frequency-domain Wiener filter with centered box PSF.
     img: uint8 or any; returns uint8; grayscale.
     ksize: odd int > 1
-    K: noise-to-signal ratio (>= 1e-6 recommended)
+    K: noise-to-signal ratio (clamped to >= 1e-6)
+    Images up to 1024 px are filtered with one global FFT; larger ones
+    (full-field mammograms) in float32 overlap-save tiles, as long as the
+    kernel margin 2*ksize/sqrt(K) fits in 512 px (K >= ~7.5e-4 at ksize=7).
+    Below that the kernel spans most of the image and the global FFT is used.
     """
     g = _ensure_u8_gray(img)
     if g is None or g.size == 0:
@@ -100,50 +321,59 @@ def wiener(img, ksize=7, K=0.01):
     if g.ndim != 2:
         # enforce grayscale
         g = cv2.cvtColor(g, cv2.COLOR_BGR2GRAY)
-    # hard cap supported size to avoid accidentally processing huge full-size images
-    if max(g.shape) > 1024:
-        # optionally downscale or just return original to avoid hour-long FFTs
-        # g = cv2.resize(g, (1024, int(g.shape[0]*1024/g.shape[1])))  # optional
-        return g
 
     g_f = g.astype(np.float32) / 255.0
-    h, w = g_f.shape
-
-    # ensure odd, min 3
-    ksize = int(max(3, ksize // 2 * 2 + 1))
-
-    # centered PSF (box) then circularly shift to top-left for FFT
-    psf = np.ones((ksize, ksize), np.float32)
-    psf /= psf.sum()
-    pad = np.zeros_like(g_f, dtype=np.float32)
-    cy, cx = h // 2, w // 2
-    ky, kx = psf.shape
-    sy, sx = cy - ky // 2, cx - kx // 2
-    pad[sy:sy+ky, sx:sx+kx] = psf
-    pad = np.roll(pad, shift=(-cy, -cx), axis=(0, 1))  # center → origin
-
-    G = np.fft.fft2(g_f)
-    H = np.fft.fft2(pad)
-
-    H_abs2 = np.abs(H)**2
-    K = max(float(K), 1e-6)
-    W = np.conj(H) / (H_abs2 + K)
+    ksize, K = _wiener_params(ksize, K)
 
-    F_hat = W * G
-    f_hat = np.fft.ifft2(F_hat).real
+    if _wiener_use_tiles(g.shape, ksize, K):
+        return _wiener_u8(_wiener_tiled(g_f, ksize, K), dst)
+    G = np.fft.fft2(g_f)  # bound first: W * fft2(...) would be computed in place as G * W
+    W = _wiener_transfer(g_f.shape, ksize, K)
+    return _wiener_u8(np.ascontiguousarray(np.fft.ifft2(W * G).real), dst)
 
-    f_hat = np.clip(f_hat, 0.0, 1.0)
-    out = (f_hat * 255.0).astype(np.uint8)
-    return out
+def wiener_stack(images, ksize=7, K=0.01, out=None):
+    """
+    Wiener-filter many images, sharing one cached W per shape: images are
+    grouped by shape, converted to float32 as one block per group, and W is
+    looked up once per group. The FFTs still run per slice; numpy's pocketfft
+    is no faster on an (n, H, W) batch and slower once it leaves the CPU cache.
+    images: (N, H, W) uint8 array or a list of 2-D images (may be ragged).
+    Returns an (N, H, W) uint8 array for array input, else a list; `out`
+    (a stack, or a list of dst buffers) receives the results when given.
+    Per-image output is identical to wiener().
+    """
+    ksize, K = _wiener_params(ksize, K)
+    gray = [_ensure_u8_gray(im) for im in images]
+    dsts = list(out) if out is not None else [None] * len(gray)
+    res = [None] * len(gray)
+    groups = {}
+    for i, g in enumerate(gray):
+        if g is None or g.size == 0:
+            continue
+        if max(g.shape) > _WIENER_GLOBAL_MAX:
+            res[i] = wiener(g, ksize, K, dst=dsts[i])
+        else:
+            groups.setdefault(g.shape, []).append(i)
+    for shape, idx in groups.items():
+        g_f = np.stack([gray[i] for i in idx]).astype(np.float32) / 255.0
+        W = _wiener_transfer(shape, ksize, K)
+        for j, i in enumerate(idx):
+            G = np.fft.fft2(g_f[j])
+            res[i] = _wiener_u8(np.ascontiguousarray(np.fft.ifft2(W * G).real), dsts[i])
+    if isinstance(images, np.ndarray) and all(r is not None for r in res):
+        if out is not None:
+            return out
+        return np.stack(res) if res else np.empty((0,) + images.shape[1:3], np.uint8)
+    return res
 
 # -------- Pipeline dict --------
 
-def histeq_median(img):
+def histeq_median(img, dst=None):
     g = hist_eq(img)
-    out = median(g, k=3)
+    out = median(g, k=3, dst=dst)
     return out
 
-def gaussian(img, ksize=5, sigma=0):
+def gaussian(img, ksize=5, sigma=0, dst=None):
     """
     Gaussian blur denoiser.
     - ksize: odd kernel size (e.g., 3,5,7). Must be positive and odd.
@@ -154,11 +384,10 @@ def gaussian(img, ksize=5, sigma=0):
     if g is None:
         return None
     k = int(max(3, (ksize // 2) * 2 + 1))  # force odd, >=3
-    out = cv2.GaussianBlur(g, (k, k), sigmaX=float(sigma), sigmaY=0)
+    out = cv2.GaussianBlur(g, (k, k), sigmaX=float(sigma), sigmaY=0, dst=dst)
     return out
 
 
-
 PIPELINES = {
     "bilateral": bilateral,
     "clahe": clahe,
@@ -171,4 +400,102 @@ PIPELINES = {
     "wiener": wiener,
     "histeq_median": histeq_median,
     "gaussian": gaussian,
-}
\ No newline at end of file
+}
+# -------- Batch forms --------
+# BATCH_PIPELINES[name](images) takes an (N, H, W) uint8 stack (or a list of
+# possibly ragged images) and returns the same kind. Gray conversion and dtype
+# checks run once per call; shared-LUT point ops (gamma) are one cv2.LUT pass
+# over the whole stack, and OpenCV filters loop per image writing straight
+# into the output stack (no clip_01 copies). `out` optionally supplies the
+# result storage: an (N, H, W) uint8 stack, or a list of per-image dst buffers
+# (e.g. from BUFFERS) for ragged input.
+# The filters themselves are the single-image functions above (with dst=the
+# output slot), so per-image results are identical to PIPELINES[name].
+
+def gray_stack(images):
+    """(N, H, W) uint8 array for array input ((N, H, W, C) is converted), else a list of gray uint8 images."""
+    if isinstance(images, np.ndarray):
+        if images.ndim == 4:
+            if images.shape[-1] == 1:
+                images = images[..., 0]
+            else:
+                images = np.stack([cv2.cvtColor(im, cv2.COLOR_BGR2GRAY) for im in images]) if len(images) else images[..., 0]
+        if images.dtype != np.uint8:
+            images = np.clip(images, 0, 255).astype(np.uint8)
+        return np.ascontiguousarray(images)
+    return [_to_gray_u8(im) for im in images]
+
+def _map_stack(images, fn, out=None):
+    # fn(gray, dst) -> result; dst is a view into the output stack / a caller buffer, or None
+    gray = gray_stack(images)
+    if isinstance(gray, np.ndarray) and out is None:
+        out = np.empty_like(gray)
+    if out is None:
+        return [fn(g, None) for g in gray]
+    res = []
+    for g, o in zip(gray, out):
+        r = fn(g, o)
+        if r is not o and r is not None and o is not None and r.shape == o.shape:
+            o[...] = r
+            r = o
+        res.append(r)
+    return out if isinstance(gray, np.ndarray) else res
+
+def lut_stack(images, lut, out=None):
+    """Apply one 256-entry uint8 LUT to every image with a single cv2.LUT call over the stack."""
+    gray = gray_stack(images)
+    if not isinstance(gray, np.ndarray):
+        return _map_stack(gray, lambda g, o: cv2.LUT(g, lut, o), out)
+    n, h, w = gray.shape
+    if gray.size == 0:
+        return gray.copy()
+    if out is None or not isinstance(out, np.ndarray) or not out.flags.c_contiguous:
+        return _map_stack(gray, lambda g, o: cv2.LUT(g, lut, o), out)
+    cv2.LUT(gray.reshape(n * h, w), lut, out.reshape(n * h, w))
+    return out
+
+def hist_eq_batch(images, out=None):
+    # per-image histograms differ; cv2.equalizeHist (hist + LUT in one C call) beats
+    # numpy bincount/take_along_axis over the stack by ~8x, so this loops
+    return _map_stack(images, lambda g, o: hist_eq(g, dst=o), out)
+
+def bilateral_batch(images, d=7, sigmaColor=50, sigmaSpace=50, out=None):
+    return _map_stack(images, lambda g, o: bilateral(g, d, sigmaColor, sigmaSpace, dst=o), out)
+
+def clahe_batch(images, clip=2.0, tile=(8,8), out=None):
+    return _map_stack(images, lambda g, o: clahe(g, clip, tile, dst=o), out)
+
+def unsharp_batch(images, k=1.0, out=None):
+    return _map_stack(images, lambda g, o: unsharp(g, k, dst=o), out)
+
+def median_batch(images, k=3, out=None):
+    return _map_stack(images, lambda g, o: median(g, k, dst=o), out)
+
+def nlm_batch(images, h=10, out=None):
+    return _map_stack(images, lambda g, o: nlm(g, h, dst=o), out)
+
+def gamma_08_batch(images, out=None):
+    return lut_stack(images, gamma_lut(0.8), out)
+
+def gamma_12_batch(images, out=None):
+    return lut_stack(images, gamma_lut(1.2), out)
+
+def histeq_median_batch(images, out=None):
+    return median_batch(hist_eq_batch(images), k=3, out=out)
+
+def gaussian_batch(images, ksize=5, sigma=0, out=None):
+    return _map_stack(images, lambda g, o: gaussian(g, ksize, sigma, dst=o), out)
+
+BATCH_PIPELINES = {
+    "bilateral": bilateral_batch,
+    "clahe": clahe_batch,
+    "hist_eq": hist_eq_batch,
+    "unsharp": unsharp_batch,
+    "median": median_batch,
+    "nlm": nlm_batch,
+    "gamma_08": gamma_08_batch,
+    "gamma_12": gamma_12_batch,
+    "wiener": wiener_stack,
+    "histeq_median": histeq_median_batch,
+    "gaussian": gaussian_batch,
+}
@@ -1,5 +1,9 @@
-import os, shutil, random
-import pandas as pd
+import os, sys, shutil, random
+
+# Ensure repo root on path when running as a script
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from src.utils.materialize import SplitWriter
+from src.preprocessing.ddsm_match import read_descriptions, filename_labels
 
 # ----- CONFIG -----
 JPEG_ROOT = "data/raw/archive/jpeg"              # Where all deep subfolders with images are
@@ -16,6 +20,7 @@ VAL_DIR = "data/val"
 TEST_DIR = "data/test"
 TRAIN_PCT = 0.7
 VAL_PCT = 0.15
+SPLIT_MODE = "copy"  # copy | hardlink | symlink | reflink | virtual (see src/utils/materialize.py)
 
 # ----- 1. FLATTEN ALL IMAGES -----
 os.makedirs(OUTPUT_FLAT, exist_ok=True)
@@ -33,22 +38,8 @@ print("Done flattening.")
 os.makedirs(f"{OUTPUT_SORTED}/benign", exist_ok=True)
 os.makedirs(f"{OUTPUT_SORTED}/malignant", exist_ok=True)
 # Create a mapping: filename -> label
-filename_to_label = {}
-for csv_file in CSV_FILES:
-    df = pd.read_csv(csv_file)
-    for idx, row in df.iterrows():
-        # The filename may be the last item of 'image file path', e.g. "1.3.6.1.4...jpg"
-        if 'image file path' in row:
-            filename = row['image file path'].split('/')[-1].replace('.dcm', '.jpg') # change to .png if needed
-        else:
-            continue
-        label = row.get('pathology', row.get('abnormality type', None))
-        if label is None:
-            continue
-        label = label.strip().lower()
-        if label not in ['benign', 'malignant']:
-            continue
-        filename_to_label[filename] = label
+# The filename is the last item of 'image file path', e.g. "1.3.6.1.4...jpg"
+filename_to_label = filename_labels(read_descriptions(CSV_FILES))
 
 # Move images into correct folders
 print("Sorting images into benign/malignant...")
@@ -60,7 +51,7 @@ for fname, label in filename_to_label.items():
 print("Done sorting.")
 
 # ----- 3. SPLIT INTO TRAIN/VAL/TEST -----
-def split_class_images(src_dir, train_dir, val_dir, test_dir, class_name, train_pct, val_pct):
+def split_class_images(src_dir, train_dir, val_dir, test_dir, class_name, train_pct, val_pct, writer=None):
     images = [f for f in os.listdir(src_dir) if f.endswith('.jpg') or f.endswith('.png')]
     random.shuffle(images)
     n = len(images)
@@ -70,14 +61,16 @@ def split_class_images(src_dir, train_dir, val_dir, test_dir, class_name, train_
         val_dir: images[n_train:n_train+n_val],
         test_dir: images[n_train+n_val:]
     }
+    writer = writer or SplitWriter(os.path.dirname(os.path.normpath(train_dir)), "copy", manifest=False)
     for split_dir, img_list in splits.items():
-        full_dir = os.path.join(split_dir, class_name)
-        os.makedirs(full_dir, exist_ok=True)
+        split = os.path.basename(os.path.normpath(split_dir))
         for img in img_list:
-            shutil.copy(os.path.join(src_dir, img), os.path.join(full_dir, img))
+            writer.add(os.path.join(src_dir, img), split, class_name)
 
-split_class_images(f"{OUTPUT_SORTED}/benign", TRAIN_DIR, VAL_DIR, TEST_DIR, "benign", TRAIN_PCT, VAL_PCT)
-split_class_images(f"{OUTPUT_SORTED}/malignant", TRAIN_DIR, VAL_DIR, TEST_DIR, "malignant", TRAIN_PCT, VAL_PCT)
+split_writer = SplitWriter(os.path.dirname(TRAIN_DIR), SPLIT_MODE)
+split_class_images(f"{OUTPUT_SORTED}/benign", TRAIN_DIR, VAL_DIR, TEST_DIR, "benign", TRAIN_PCT, VAL_PCT, split_writer)
+split_class_images(f"{OUTPUT_SORTED}/malignant", TRAIN_DIR, VAL_DIR, TEST_DIR, "malignant", TRAIN_PCT, VAL_PCT, split_writer)
+split_writer.close()
 print("Finished splitting into train/val/test with class folders.")
 
 print("Dataset is now ready for model training (baseline). To train, run your train.py or main.py.")
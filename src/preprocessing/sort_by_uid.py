@@ -1,12 +1,18 @@
 # src/preprocessing/sort_by_uid.py
-import os, re, shutil
+import os, sys, shutil
 import pandas as pd
-from collections import defaultdict
+
+# Ensure repo root on path when running as a script
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from src.utils.materialize import SplitWriter
+from src.preprocessing.ddsm_match import read_descriptions, path_columns, match_by_uid
+from src.preprocessing.uid_index import open_index
 
 # Adjust to your layout
 RAW_ROOTS = [
     "data/raw/archive/jpeg"
 ]
+UID_INDEX_DB = "data/raw/archive/uid_index.sqlite"  # refreshed incrementally on each run
 CSV_FILES = [
     "data/raw/archive/csv/mass_case_description_train_set.csv",
     "data/raw/archive/csv/mass_case_description_test_set.csv",
@@ -16,103 +22,52 @@ CSV_FILES = [
 
 OUT_BENIGN = "data/preprocessed_all/benign"
 OUT_MALIGN = "data/preprocessed_all/malignant"
+SPLIT_MODE = "copy"  # copy | hardlink | symlink | reflink | virtual (see src/utils/materialize.py)
 os.makedirs(OUT_BENIGN, exist_ok=True)
 os.makedirs(OUT_MALIGN, exist_ok=True)
 
-# 1) Extract DICOM UIDs from a path string
-UID_RE = re.compile(r"(?:1\.3\.6(?:\.\d+){5,})")  # matches 1.3.6.1.4.1.9590... style
-
-def extract_uids(s: str):
-    s = str(s).strip().replace("\\", "/")
-    return UID_RE.findall(s)
-
-# 2) Build an index: UID -> list of image paths containing that UID in the filename
+# 1) Index: UID -> image paths containing that UID in the filename
 print("Indexing images by UID...")
-uid_to_paths = defaultdict(list)
-
-def index_root(root):
-    if not os.path.isdir(root):
-        return
-    for r, _, files in os.walk(root):
-        for f in files:
-            if f.lower().endswith((".jpg",".jpeg",".png",".tif",".tiff")):
-                full = os.path.join(r, f)
-                name = f.lower()
-                # collect all UID-like substrings present in the filename
-                for uid in UID_RE.findall(name):
-                    uid_to_paths[uid].append(full)
-
+uid_to_path = []
 for rr in RAW_ROOTS:
-    index_root(rr)
-
-print(f"Indexed UIDs: {len(uid_to_paths)}")
+    index = open_index(rr, UID_INDEX_DB)
+    uid_to_path.append(index.uid_paths((".jpg",".jpeg",".png",".tif",".tiff")))
+    index.close()
+uid_to_path = pd.concat(uid_to_path).drop_duplicates("uid")  # first path per UID
+print(f"Indexed UIDs: {len(uid_to_path)}")
 
-def get_label(row):
-    for k in ["pathology","Pathology","label","Label"]:
-        if k in row and isinstance(row[k], str) and row[k].strip():
-            v = row[k].strip().lower()
-            if v in ("benign","malignant"):
-                return v
-    return None
-
-copied = {"benign":0, "malignant":0}
-missing_rows = []
-
-def copy_first(paths, dst_dir):
-    if not paths:
-        return False
-    src = paths[0]  # take first match
+def copy_first(src, dst_dir):
     dst = os.path.join(dst_dir, os.path.basename(src))
     if not os.path.exists(dst):
         shutil.copy(src, dst)
-    return True
 
+# 2) Match every CSV row at once: the first UID (across path columns) with an image wins
 print("Matching CSV rows to images by UID...")
-for csv_path in CSV_FILES:
-    if not os.path.exists(csv_path):
-        print("Missing CSV:", csv_path); continue
-    df = pd.read_csv(csv_path)
-    # Use the two path columns in mass/calc CSVs
-    path_cols = [c for c in df.columns if "file path" in c.lower() or c.lower().endswith("path")]
-    if not path_cols:
-        print("No path columns found in", csv_path, "Columns:", list(df.columns))
-        continue
-
-    for _, row in df.iterrows():
-        label = get_label(row)
-        if label not in ("benign","malignant"):
-            continue
-
-        matched = False
-        # Check all path-like columns for UIDs
-        for c in path_cols:
-            uids = extract_uids(row[c])
-            for uid in uids:
-                # direct UID match
-                paths = uid_to_paths.get(uid, [])
-                if paths:
-                    matched = copy_first(paths, OUT_BENIGN if label=="benign" else OUT_MALIGN)
-                    if matched:
-                        copied[label] += 1
-                        break
-            if matched:
-                break
-
-        if not matched:
-            # Record the row id or image path for inspection
-            missing_rows.append({ "csv": os.path.basename(csv_path), "row": dict(row) })
+desc = read_descriptions(CSV_FILES)
+path_cols = path_columns(desc, exact_suffix=True)
+if not path_cols:
+    print("No path columns found. Columns:", list(desc.columns))
+desc = desc[desc["label"].isin(["benign","malignant"])]
+matched, unmatched = match_by_uid(desc, path_cols, uid_to_path)
+
+copied = matched["label"].value_counts().reindex(["benign","malignant"], fill_value=0).to_dict()
+for src, label in zip(matched["path"], matched["label"]):
+    copy_first(src, OUT_BENIGN if label=="benign" else OUT_MALIGN)
+# Record the row for inspection
+missing_rows = [{"csv": r.pop("csv"), "row": r} for r in unmatched.drop(columns="label").head(200).to_dict("records")]
 
 print(f"Copied benign: {copied['benign']} | malignant: {copied['malignant']}")
-print(f"Unmatched rows: {len(missing_rows)}")
+print(f"Unmatched rows: {len(unmatched)}")
 
 if missing_rows:
     import json
     with open("unmatched_rows.json","w") as f:
-        json.dump(missing_rows[:200], f, indent=2)  # cap for brevity
+        json.dump(missing_rows, f, indent=2)  # cap for brevity
     print("Wrote unmatched_rows.json (first 200). Inspect sample paths/UIDs.")
 
 # Optional: split into train/val/test after successful copies
-def split_class(src_dir, cls, train_pct=0.7, val_pct=0.15):
+def split_class(src_dir, cls, train_pct=0.7, val_pct=0.15, writer=None):
+    writer = writer or SplitWriter("data", "copy", manifest=False)
     import random
     files = [f for f in os.listdir(src_dir) if f.lower().endswith((".jpg",".jpeg",".png",".tif",".tiff"))]
     random.shuffle(files)
@@ -120,18 +75,15 @@ def split_class(src_dir, cls, train_pct=0.7, val_pct=0.15):
     n_train, n_val = int(train_pct*n), int(val_pct*n)
     splits = {"train": files[:n_train], "val": files[n_train:n_train+n_val], "test": files[n_train+n_val:]}
     for sp, flist in splits.items():
-        out = os.path.join("data", sp, cls)
-        os.makedirs(out, exist_ok=True)
         for f in flist:
-            src = os.path.join(src_dir, f)
-            dst = os.path.join(out, f)
-            if not os.path.exists(dst):
-                shutil.copy(src, dst)
+            writer.add(os.path.join(src_dir, f), sp, cls)
 
 # Only split if we actually copied some files
+split_writer = SplitWriter("data", SPLIT_MODE)
 if any(os.scandir(OUT_BENIGN)):
-    split_class(OUT_BENIGN, "benign")
+    split_class(OUT_BENIGN, "benign", writer=split_writer)
 if any(os.scandir(OUT_MALIGN)):
-    split_class(OUT_MALIGN, "malignant")
+    split_class(OUT_MALIGN, "malignant", writer=split_writer)
+split_writer.close()
 
 print("Done. Verify with:\n  find data/preprocessed/benign -type f | wc -l\n  find data/preprocessed/malignant -type f | wc -l\n  find data/train -type f | wc -l")
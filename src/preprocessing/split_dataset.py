@@ -1,6 +1,10 @@
-import os, shutil, random
+import os, sys, random
 
-def split_dataset(img_dir, train_dir, val_dir, test_dir, train_pct=0.7, val_pct=0.15):
+# Ensure repo root on path when running as a script
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from src.utils.materialize import place
+
+def split_dataset(img_dir, train_dir, val_dir, test_dir, train_pct=0.7, val_pct=0.15, mode="copy"):
     img_files = [f for f in os.listdir(img_dir) if f.endswith('.jpg')]
     random.shuffle(img_files)
     n_total = len(img_files)
@@ -17,7 +21,7 @@ def split_dataset(img_dir, train_dir, val_dir, test_dir, train_pct=0.7, val_pct=
             src_dir = os.path.join(img_dir, f)
             des_dir = os.path.join(d, f)
             # print(src_dir, "->", des_dir)
-            shutil.copy(src_dir, des_dir)
+            place(src_dir, des_dir, mode)
 
 if __name__ == "__main__":
     split_dataset("data/preprocessed_all/", "data/train/", "data/val/", "data/test/")
@@ -1,5 +1,10 @@
 # split_patientwise.py
-import os, shutil, random, re, pandas as pd
+import os, sys, random, re, argparse, pandas as pd
+
+# Ensure repo root on path when running as a script
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from src.utils.materialize import MODES, SplitWriter
+from src.preprocessing.ddsm_match import PATIENT_RE, read_descriptions, path_columns, patient_labels
 
 PRE_BEN = "data/preprocessed/benign"
 PRE_MAL = "data/preprocessed/malignant"
@@ -11,45 +16,27 @@ CSV_FILES = [
 ]
 
 def load_patient_labels():
-    pid_to_label = {}
-    pat_re = re.compile(r"(P_\d{5})", re.IGNORECASE)
-    for csv in CSV_FILES:
-        if not os.path.exists(csv): 
-            continue
-        df = pd.read_csv(csv)
-        # pick any path-like column to extract patient id
-        path_cols = [c for c in df.columns if "path" in c.lower()]
-        if not path_cols:
-            continue
-        for _, row in df.iterrows():
-            label = str(row.get("pathology","")).strip().lower()
-            if label not in ("benign","malignant"):
-                continue
-            s = " ".join([str(row[c]) for c in path_cols if not pd.isna(row[c])])
-            m = pat_re.search(s)
-            if m:
-                pid = m.group(1).upper()
-                pid_to_label[pid] = label
-    return pid_to_label
+    desc = read_descriptions(CSV_FILES)
+    # pick any path-like column to extract patient id
+    return patient_labels(desc, path_columns(desc))
 
 def build_pid_index():
     # Map from patient id to list of image paths in preprocessed folders
     pid_index = {"benign": {}, "malignant": {}}
-    pat_re = re.compile(r"(P_\d{5})", re.IGNORECASE)
     for label, root in [("benign", PRE_BEN), ("malignant", PRE_MAL)]:
-        for f in os.listdir(root):
-            if not f.lower().endswith((".jpg",".jpeg",".png",".tif",".tiff",".bmp")):
-                continue
-            m = pat_re.search(f)
-            pid = (m.group(1).upper() if m else f)  # fallback to filename
+        names = pd.Series([f for f in os.listdir(root) if f.lower().endswith((".jpg",".jpeg",".png",".tif",".tiff",".bmp"))], dtype="object")
+        pids = names.str.extract(PATIENT_RE, flags=re.IGNORECASE, expand=False).str.upper().fillna(names)  # fallback to filename
+        for pid, f in zip(pids, names):
             pid_index[label].setdefault(pid, []).append(os.path.join(root, f))
     return pid_index
 
-def split_by_patient(pid_index, train_pct=0.7, val_pct=0.15):
-    for d in ["data/train/benign","data/train/malignant",
-              "data/val/benign","data/val/malignant",
-              "data/test/benign","data/test/malignant"]:
-        os.makedirs(d, exist_ok=True)
+def split_by_patient(pid_index, train_pct=0.7, val_pct=0.15, writer=None):
+    writer = writer or SplitWriter("data", "copy", manifest=False)
+    if writer.mode != "virtual":
+        for d in ["data/train/benign","data/train/malignant",
+                  "data/val/benign","data/val/malignant",
+                  "data/test/benign","data/test/malignant"]:
+            os.makedirs(d, exist_ok=True)
     for label in ["benign","malignant"]:
         pids = list(pid_index[label].keys())
         random.shuffle(pids)
@@ -59,17 +46,24 @@ def split_by_patient(pid_index, train_pct=0.7, val_pct=0.15):
         for sp, pid_list in splits.items():
             for pid in pid_list:
                 for src in pid_index[label][pid]:
-                    dst = os.path.join("data", sp, label, os.path.basename(src))
-                    if not os.path.exists(dst):
-                        shutil.copy(src, dst)
+                    writer.add(src, sp, label, pid=pid)
 
 if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--mode", choices=MODES, default="copy",
+                    help="how files are placed in data/<split>/<class>; 'virtual' only writes data/split_manifest.csv")
+    ap.add_argument("--hash", action="store_true", help="record a sha1 per file in the split manifest")
+    args = ap.parse_args()
     random.seed(42)
     pid_labels = load_patient_labels()   # not strictly required but can be used for checks
     pid_index = build_pid_index()
     # Optional sanity: print class patient counts
     print("Benign patients:", len(pid_index["benign"]), "Malignant patients:", len(pid_index["malignant"]))
-    split_by_patient(pid_index)
+    writer = SplitWriter("data", args.mode, with_hash=args.hash)
+    split_by_patient(pid_index, writer=writer)
+    writer.close()
+    if args.mode == "virtual":
+        raise SystemExit(0)
     for sp in ["train","val","test"]:
         for cls in ["benign","malignant"]:
             import subprocess
@@ -0,0 +1,144 @@
+import os, re, sys, time, sqlite3, argparse
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+
+# Ensure repo root on path when running as a script
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from src.preprocessing.ddsm_match import UID_RE
+
+# Persistent index of the raw JPEG archive: directories (with mtime), image
+# files (size/mtime) and UID -> path rows for UIDs found in file names.
+# Only directories whose mtime changed are re-listed on later runs. One
+# database can hold several roots; each UidIndex only sees its own subtree.
+
+IMG_EXTS = (".jpg", ".jpeg", ".png", ".tif", ".tiff", ".bmp")
+DEFAULT_ROOT = "data/raw/archive/jpeg"
+DEFAULT_DB = "data/raw/archive/uid_index.sqlite"
+_UID = re.compile(UID_RE)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dirs (path TEXT PRIMARY KEY, parent TEXT, mtime_ns INTEGER);
+CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, dir TEXT, size INTEGER, mtime_ns INTEGER);
+CREATE TABLE IF NOT EXISTS uids (uid TEXT, path TEXT);
+CREATE INDEX IF NOT EXISTS dirs_parent ON dirs(parent);
+CREATE INDEX IF NOT EXISTS files_dir ON files(dir);
+CREATE INDEX IF NOT EXISTS uids_uid ON uids(uid);
+CREATE INDEX IF NOT EXISTS uids_path ON uids(path);
+"""
+
+def _scan(path, known_mtime, full):
+    """
+    Stat one directory; list it only when new/changed (or full). Returns
+    (path, mtime_ns, listed, files, subdirs) where files/subdirs are None if not listed.
+    """
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return path, None, False, None, None
+    if not full and mtime == known_mtime:
+        return path, mtime, False, None, None
+    files, subdirs = [], []
+    with os.scandir(path) as it:
+        for e in it:
+            if e.is_dir(follow_symlinks=False):
+                subdirs.append(e.path)
+            elif e.name.lower().endswith(IMG_EXTS):
+                st = e.stat()
+                files.append((e.path, st.st_size, st.st_mtime_ns))
+    return path, mtime, True, files, subdirs
+
+class UidIndex:
+    def __init__(self, root=DEFAULT_ROOT, db=DEFAULT_DB):
+        self.root = os.path.normpath(root)
+        os.makedirs(os.path.dirname(db) or ".", exist_ok=True)
+        self.con = sqlite3.connect(db)
+        self.con.executescript(SCHEMA)
+
+    def _under(self, path):
+        # "path = ? OR path LIKE ?" arguments matching `path` and everything below it
+        like = path.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + os.sep + "%"
+        return "(path = ? OR path LIKE ? ESCAPE '\\')", (path, like)
+
+    def _drop_tree(self, path):
+        where, args = self._under(path)
+        for table in ("uids", "files", "dirs"):
+            self.con.execute(f"DELETE FROM {table} WHERE {where}", args)
+
+    def update(self, workers=16, full=False):
+        """Walk the tree breadth-first with a thread pool; returns {'dirs', 'listed', 'files'}."""
+        where, args = self._under(self.root)
+        rows = self.con.execute(f"SELECT path, parent, mtime_ns FROM dirs WHERE {where}", args).fetchall()
+        known = {p: m for p, _, m in rows}
+        children = {}
+        for p, parent, _ in rows:
+            children.setdefault(parent, []).append(p)
+        seen, listed = set(), 0
+        frontier = [self.root] if os.path.isdir(self.root) else []
+        with ThreadPoolExecutor(max_workers=workers) as pool, self.con:
+            while frontier:
+                nxt = []
+                for path, mtime, was_listed, files, subdirs in pool.map(
+                        lambda p: _scan(p, known.get(p), full), frontier):
+                    if mtime is None:
+                        continue
+                    seen.add(path)
+                    if not was_listed:
+                        nxt += children.get(path, [])
+                        continue
+                    listed += 1
+                    parent = os.path.dirname(path) if path != self.root else None
+                    self.con.execute("INSERT OR REPLACE INTO dirs VALUES (?,?,?)", (path, parent, mtime))
+                    self.con.execute("DELETE FROM uids WHERE path IN (SELECT path FROM files WHERE dir = ?)", (path,))
+                    self.con.execute("DELETE FROM files WHERE dir = ?", (path,))
+                    self.con.executemany("INSERT INTO files VALUES (?,?,?,?)", [(f, path, s, m) for f, s, m in files])
+                    self.con.executemany("INSERT INTO uids VALUES (?,?)",
+                                         [(u, f) for f, _, _ in files for u in _UID.findall(os.path.basename(f).lower())])
+                    nxt += subdirs
+                frontier = nxt
+            # directories that disappeared since the last run
+            for path in set(known) - seen:
+                self._drop_tree(path)
+        n_files = self.con.execute(f"SELECT COUNT(*) FROM files WHERE {where}", args).fetchone()[0]
+        return {"dirs": len(seen), "listed": listed, "files": n_files}
+
+    def files(self, exts=IMG_EXTS):
+        """DataFrame(path, size, mtime_ns) of indexed images with one of exts, sorted by path."""
+        where, args = self._under(self.root)
+        df = pd.read_sql_query(f"SELECT path, size, mtime_ns FROM files WHERE {where} ORDER BY path", self.con, params=args)
+        return df[df["path"].str.lower().str.endswith(tuple(exts))].reset_index(drop=True)
+
+    def uid_paths(self, exts=IMG_EXTS):
+        """(uid, path) for UIDs in file names, first path per UID; same shape as ddsm_match.uid_file_index."""
+        where, args = self._under(self.root)
+        df = pd.read_sql_query(f"SELECT uid, path FROM uids WHERE {where} ORDER BY uid, path", self.con, params=args)
+        df = df[df["path"].str.lower().str.endswith(tuple(exts))]
+        return df.drop_duplicates("uid").reset_index(drop=True)
+
+    def lookup(self, uid):
+        where, args = self._under(self.root)
+        return [p for (p,) in self.con.execute(f"SELECT path FROM uids WHERE uid = ? AND {where} ORDER BY path", (uid,) + args)]
+
+    def close(self):
+        self.con.close()
+
+def open_index(root=DEFAULT_ROOT, db=DEFAULT_DB, workers=16, full=False):
+    """Open and refresh the index, printing a one-line summary."""
+    t0 = time.time()
+    index = UidIndex(root, db)
+    stats = index.update(workers=workers, full=full)
+    print(f"UID index {db}: {stats['files']} files in {stats['dirs']} dirs "
+          f"({stats['listed']} re-listed) in {time.time() - t0:.1f}s")
+    return index
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--root", default=DEFAULT_ROOT)
+    ap.add_argument("--db", default=DEFAULT_DB)
+    ap.add_argument("--workers", type=int, default=16, help="threads listing directories")
+    ap.add_argument("--full", action="store_true", help="re-list every directory (e.g. after in-place file edits)")
+    ap.add_argument("--lookup", nargs="*", default=[], help="print the paths indexed for these UIDs")
+    args = ap.parse_args()
+    index = open_index(args.root, args.db, args.workers, args.full)
+    for uid in args.lookup:
+        print(uid, index.lookup(uid))
+    index.close()
@@ -1,47 +1,146 @@
-import os, argparse, json, subprocess, time
+import os, sys, argparse, json, shlex, time, hashlib
 
-def run(cmd):
-    print(">>", cmd); ret = subprocess.call(cmd, shell=True); 
-    if ret != 0: raise SystemExit(ret)
+# Ensure repo root on path when running as a script
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from src.preprocessing.pipeline_graph import spec_dirname
+from src.utils.apply_pipeline import LIST_NAMES, read_list
+from src.utils.profiler import Profiler
 
-if __name__ == "__main__":
-    ap = argparse.ArgumentParser()
-    ap.add_argument("--name", required=True)              # e.g., exp1_bilateral
-    ap.add_argument("--pipeline", required=True)          # e.g., bilateral / clahe / hist_eq / ...
-    ap.add_argument("--img_size", type=int, nargs=2, default=[128,128])
-    ap.add_argument("--gray", action="store_true")
-    args = ap.parse_args()
+TENSOR_CACHE_ROOT = "data/tensor_cache"
 
-    exp_dir = os.path.join("experiments", args.name)
-    os.makedirs(exp_dir, exist_ok=True)
-    os.makedirs(os.path.join(exp_dir, "models"), exist_ok=True)
-    os.makedirs(os.path.join(exp_dir, "results"), exist_ok=True)
-    os.makedirs(os.path.join(exp_dir, "logs"), exist_ok=True)
-    os.makedirs(os.path.join(exp_dir, "figs"), exist_ok=True)
+def cache_key(split_rows, pipeline, img_size, seed):
+    """Fingerprint of a tensor cache's inputs: pipeline code, size, seed and every source's (path, size, mtime)."""
+    from src.utils.enhance_cache import pipeline_fingerprint
+    h = hashlib.sha1(json.dumps([pipeline_fingerprint(pipeline), list(img_size), seed]).encode())
+    for split in sorted(split_rows):
+        for path, cls in split_rows[split]:
+            try:
+                st = os.stat(path)
+                h.update(f"{split}|{cls}|{path}|{st.st_size}|{st.st_mtime_ns}\n".encode())
+            except OSError:
+                h.update(f"{split}|{cls}|{path}|missing\n".encode())
+    return h.hexdigest()
+
+def run_inprocess(args, prof, exp_dir, lists_dir, seed=42):
+    """
+    Enhance -> train -> evaluate in this interpreter. Sources are enhanced at
+    full resolution and resized straight into a memmap tensor cache (no
+    data/enhanced tree, no split rebuild); the cache is reused while its
+    inputs are unchanged, and TensorFlow is imported once for both training
+    and evaluation.
+    """
+    with prof.stage("import_tf"):
+        from keras.models import load_model
+        from src.models.train import configure_runtime, train_model
+        from src.models.evaluate import evaluate_model
+        from src.utils.shards import SPLITS, list_from_lists
+        from src.utils.tensor_cache import MemmapSequence, materialize
+        print("Runtime:", configure_runtime(args.precision, args.intra_op, args.inter_op))
+    img_size = tuple(args.img_size)
+    split_rows = {sp: list_from_lists(lists_dir, sp) for sp in SPLITS}
+    cache_dir = os.path.join(TENSOR_CACHE_ROOT, f"{spec_dirname(args.pipeline)}_{img_size[0]}x{img_size[1]}")
+
+    # 1) Enhance into the tensor cache
+    with prof.stage("enhance", outputs=[cache_dir], files_read=sum(map(len, split_rows.values()))) as stage:
+        key = cache_key(split_rows, args.pipeline, img_size, seed)
+        meta_path = os.path.join(cache_dir, "meta.json")
+        meta = {}
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+        stage["cache_hit"] = not args.no_cache and meta.get("key") == key
+        if stage["cache_hit"]:
+            print("Tensor cache up to date:", cache_dir)
+        else:
+            materialize(cache_dir, split_rows, img_size, seed, args.pipeline, key=key)
+
+    # 2) Train
+    model_path = os.path.join(exp_dir, "models", f"{args.name}.h5")
+    epoch_log = os.path.join(exp_dir, "logs", "epochs.json")
+    with prof.stage("train", outputs=[model_path]):
+        train_model(None, None, model_path, cache_dir=cache_dir, epoch_log=epoch_log, jit_compile=args.jit_compile)
+    prof.attach_epochs("train", epoch_log)
+
+    # 3) Evaluate the best checkpoint; artifacts go straight to the experiment folder
+    with prof.stage("evaluate", outputs=[os.path.join(exp_dir, "results")]) as stage:
+        gen = MemmapSequence(cache_dir, "test", batch_size=32, shuffle=False)
+        stage.update(evaluate_model(load_model(model_path), gen, out_dir=os.path.join(exp_dir, "results")))
+    return {"tensor_cache": cache_dir}
+
+def run_subprocess(args, prof, exp_dir, lists_dir):
+    """The original chain: each step is a separate script run, passing data through data/enhanced and data/<split>."""
+    n_sources = sum(len(read_list(os.path.join(lists_dir, l))) for l in LIST_NAMES if os.path.exists(os.path.join(lists_dir, l)))
+    src_root = os.path.join("data/enhanced", spec_dirname(args.pipeline))
 
     # 1) Generate enhanced set deterministically from baseline file lists
-    run(f"python src/utils/apply_pipeline.py --pipeline {args.pipeline} --lists_dir experiments/exp0_baseline/config --out_root data/enhanced")
+    prof.run("enhance", f"python src/utils/apply_pipeline.py --pipeline {shlex.quote(args.pipeline)} --lists_dir {lists_dir} --out_root data/enhanced"
+        f" --cache_max_gb {args.cache_max_gb}{' --no_cache' if args.no_cache else ''}",
+             outputs=[src_root], files_read=n_sources)
 
     # 2) Rebuild train/val/test using exactly the same files (but enhanced)
-    src_root = os.path.join("data/enhanced", args.pipeline)
-    run(f"python src/utils/rebuild_splits_from_lists.py --lists_dir experiments/exp0_baseline/config --source_root {src_root} --out_root data")
+    prof.run("split_rebuild", f"python src/utils/rebuild_splits_from_lists.py --lists_dir {lists_dir} --source_root {src_root} --out_root data --mode {args.split_mode}",
+             outputs=["data/train", "data/val", "data/test", "data/split_manifest.csv"], files_read=n_sources)
+    # rebuild always writes the canonical manifest; loading from it skips the directory scans
+    split_args = " --manifest data/split_manifest.csv"
 
     # 3) Train
     model_path = os.path.join(exp_dir, "models", f"{args.name}.h5")
-    run(f"python src/models/train.py")  # ensure train.py saves to models/baseline_cancernet.h5 or accept a --save_path
+    epoch_log = os.path.join(exp_dir, "logs", "epochs.json")
+    train_args = f" --precision {args.precision} --intra_op {args.intra_op} --inter_op {args.inter_op}{' --jit_compile' if args.jit_compile else ''}"
+    prof.run("train", f"python src/models/train.py{split_args} --epoch_log {epoch_log}{train_args}",  # ensure train.py saves to models/baseline_cancernet.h5 or accept a --save_path
+             outputs=["models"])
+    prof.attach_epochs("train", epoch_log)
     # move model to exp folder if saved in default location
     if os.path.exists("models/baseline_cancernet.h5"):
         os.rename("models/baseline_cancernet.h5", model_path)
 
     # 4) Evaluate
-    run(f"TF_ENABLE_ONEDNN_OPTS=0 python src/models/evaluate.py --model {model_path} --test_dir data/test --img_size {args.img_size[0]} {args.img_size[1]} {'--gray' if args.gray else ''}")
+    prof.run("evaluate", f"TF_ENABLE_ONEDNN_OPTS=0 python src/models/evaluate.py --model {model_path} --test_dir data/test --img_size {args.img_size[0]} {args.img_size[1]} {'--gray' if args.gray else ''}{split_args}",
+             outputs=["results"])
 
     # 5) Archive results
-    for f in ["classification_report.txt","confusion_matrix.csv","confusion_matrix.png","roc_curve.png"]:
-        if os.path.exists(os.path.join("results", f)):
-            os.rename(os.path.join("results", f), os.path.join(exp_dir, "results", f))
+    with prof.stage("archive") as stage:
+        stage["files_moved"] = 0  # renames keep mtimes, so count them here
+        for f in ["classification_report.txt","confusion_matrix.csv","confusion_matrix.png","roc_curve.png","metrics.json"]:
+            if os.path.exists(os.path.join("results", f)):
+                os.rename(os.path.join("results", f), os.path.join(exp_dir, "results", f))
+                stage["files_moved"] += 1
+
+    return {}
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--name", required=True)              # e.g., exp1_bilateral
+    ap.add_argument("--pipeline", required=True)          # e.g., bilateral / clahe / hist_eq / "hist_eq|median(k=3)"
+    ap.add_argument("--img_size", type=int, nargs=2, default=[128,128])
+    ap.add_argument("--gray", action="store_true")
+    ap.add_argument("--no_cache", action="store_true")                # force a full enhancement pass
+    ap.add_argument("--cache_max_gb", type=float, default=0)          # --subprocess: LRU cap on data/enhanced (0 = unlimited)
+    ap.add_argument("--split_mode", default="copy")                   # --subprocess: copy | hardlink | symlink | reflink | virtual
+    ap.add_argument("--trace", action="store_true")                   # also write logs/trace.json (Chrome trace format)
+    ap.add_argument("--subprocess", action="store_true")              # old script chain via data/enhanced + split folders
+    ap.add_argument("--jit_compile", action="store_true")             # train: XLA-compiled steps
+    ap.add_argument("--precision", default="float32")                 # train: float32 | mixed_bfloat16
+    ap.add_argument("--intra_op", type=int, default=0)                # train: TF intra-op threads (0 = default)
+    ap.add_argument("--inter_op", type=int, default=0)                # train: TF inter-op threads (0 = default)
+    args = ap.parse_args()
+
+    exp_dir = os.path.join("experiments", args.name)
+    os.makedirs(exp_dir, exist_ok=True)
+    os.makedirs(os.path.join(exp_dir, "models"), exist_ok=True)
+    os.makedirs(os.path.join(exp_dir, "results"), exist_ok=True)
+    os.makedirs(os.path.join(exp_dir, "logs"), exist_ok=True)
+    os.makedirs(os.path.join(exp_dir, "figs"), exist_ok=True)
+
+    prof = Profiler()
+    lists_dir = "experiments/exp0_baseline/config"
+    info = (run_subprocess if args.subprocess else run_inprocess)(args, prof, exp_dir, lists_dir)
 
+    prof.save(exp_dir, trace=args.trace)
     with open(os.path.join(exp_dir, "config.json"), "w") as f:
-        json.dump({"name": args.name, "pipeline": args.pipeline, "img_size": args.img_size, "gray": args.gray, "timestamp": time.ctime()}, f, indent=2)
+        json.dump({"name": args.name, "pipeline": args.pipeline, "img_size": args.img_size, "gray": args.gray, "timestamp": time.ctime(),
+                   "mode": "subprocess" if args.subprocess else "inprocess",
+                   "train": {"jit_compile": args.jit_compile, "precision": args.precision, "intra_op": args.intra_op, "inter_op": args.inter_op},
+                   "timings_s": prof.summary(), **info}, f, indent=2)
 
     print("Finished", args.name, "->", exp_dir)
@@ -1,31 +1,206 @@
-import os, cv2, argparse
-from src.preprocessing.pipelines import PIPELINES
+import os, cv2, argparse, time
+from itertools import groupby
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from src.preprocessing.pipelines import PIPELINES, BATCH_PIPELINES, BUFFERS, THREAD_POLICIES, cv_threads_for, init_worker
+from src.preprocessing.pipeline_graph import PipelineGraph, parse_spec, spec_dirname
+from src.utils.enhance_cache import EnhanceCache, pipeline_fingerprint, source_key, evict
 
-def process_list(list_file, out_root, fn):
+LIST_NAMES = ["train_benign.txt","train_malignant.txt","val_benign.txt","val_malignant.txt","test_benign.txt","test_malignant.txt"]
+
+def read_list(list_file):
     with open(list_file) as f:
-        paths = [l.strip() for l in f if l.strip()]
-    for src in paths:
-        # src expected to start with data/preprocessed/...
-        rel = os.path.relpath(src, start="data/preprocessed")
-        dst = os.path.join(out_root, rel)
-        os.makedirs(os.path.dirname(dst), exist_ok=True)
-        img = cv2.imread(src, cv2.IMREAD_GRAYSCALE)
-        if img is None: 
+        return [l.strip() for l in f if l.strip()]
+
+def rel_path(src):
+    # src expected to start with data/preprocessed/...
+    return os.path.relpath(src, start="data/preprocessed")
+
+def enhance_one(src, out_roots, run):
+    """Decode src once; run(img) returns one output per entry of out_roots."""
+    rel = rel_path(src)
+    for out_root in out_roots:
+        os.makedirs(os.path.dirname(os.path.join(out_root, rel)), exist_ok=True)
+    img = cv2.imread(src, cv2.IMREAD_GRAYSCALE)
+    if img is None:
+        return False
+    for out_root, out in zip(out_roots, run(img)):
+        cv2.imwrite(os.path.join(out_root, rel), out)
+    return True
+
+def process_list(list_file, out_root, fn):
+    return [src for src in read_list(list_file) if enhance_one(src, [out_root], lambda img: [fn(img)])]
+
+_GRAPHS = {}
+
+def _graph(names):
+    graph = _GRAPHS.get(names)
+    if graph is None:
+        graph = _GRAPHS[names] = PipelineGraph(names)
+    return graph
+
+def process_batch(items, out_base, name):
+    """
+    Decode items, run PIPELINES[name]'s batch form over all of them at once, write each output.
+    Outputs go into buffers from this process's BUFFERS pool, returned once written.
+    """
+    out_root = os.path.join(out_base, spec_dirname(name))
+    ok, imgs = [], []
+    for item in items:
+        rel = rel_path(item[0])
+        os.makedirs(os.path.dirname(os.path.join(out_root, rel)), exist_ok=True)
+        img = cv2.imread(item[0], cv2.IMREAD_GRAYSCALE)
+        if img is not None:
+            ok.append(item)
+            imgs.append(img)
+    bufs = [BUFFERS.take(img.shape) for img in imgs]
+    for item, out in zip(ok, BATCH_PIPELINES[name](imgs, out=bufs)):
+        cv2.imwrite(os.path.join(out_root, rel_path(item[0])), out)
+    BUFFERS.give(*bufs)
+    return ok
+
+def process_items(items, out_base, batch_size=16):
+    """
+    items: [(src, pipeline names or specs)]; outputs go to <out_base>/<spec_dirname>/<rel>.
+    Runs of items needing one named pipeline use its BATCH_PIPELINES form,
+    `batch_size` sources per call. Anything else runs through one
+    PipelineGraph, so shared stages (gray conversion, hist_eq, ...) are
+    computed once per image.
+    """
+    written = []
+    for names, group in groupby(items, key=lambda item: item[1]):
+        group = list(group)
+        if len(names) == 1 and names[0] in BATCH_PIPELINES:
+            for i in range(0, len(group), batch_size):
+                written += process_batch(group[i:i+batch_size], out_base, names[0])
             continue
-        out = fn(img)
-        cv2.imwrite(dst, out)
+        graph = _graph(names)
+        out_roots = [os.path.join(out_base, spec_dirname(n)) for n in names]
+        for src, _ in group:
+            if enhance_one(src, out_roots, lambda img: list(map(graph.run(img).get, names))):
+                written.append((src, names))
+    return written
+
+def _process_chunk(out_base, items):
+    # Runs inside a worker; pipelines are looked up by name so only strings cross the process boundary
+    t0 = time.perf_counter()
+    written = process_items(items, out_base)
+    return os.getpid(), len(items), written, time.perf_counter() - t0
+
+def process_items_parallel(items, out_base, workers, chunk_size=16, max_in_flight=None, report_every=10.0,
+                           threads="pool"):
+    """
+    Fan the work items out over a process pool in chunks of `chunk_size`.
+    At most `max_in_flight` chunks (default 2 per worker) are queued at a time so
+    full-resolution images never pile up faster than they are written.
+    Each worker sets its OpenCV thread count once, per the `threads` policy
+    (see pipelines.THREAD_POLICIES), so workers x OpenCV threads never
+    oversubscribe the cores. Output is identical to the serial path: same filter, same cv2.imwrite call.
+    Returns the items that were written.
+    """
+    chunks = [items[i:i+chunk_size] for i in range(0, len(items), chunk_size)]
+    max_in_flight = max_in_flight or 2 * workers
+    per_worker = {}  # pid -> [files, busy seconds]
+    done = 0
+    written = []
+    t0 = last_report = time.perf_counter()
+
+    cv_threads = cv_threads_for(workers, threads)
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(cv_threads,)) as ex:
+        todo = iter(chunks)
+        pending = set()
+        while True:
+            while len(pending) < max_in_flight:
+                chunk = next(todo, None)
+                if chunk is None:
+                    break
+                pending.add(ex.submit(_process_chunk, out_base, chunk))
+            if not pending:
+                break
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                pid, n, ok, secs = fut.result()
+                written.extend(ok)
+                stats = per_worker.setdefault(pid, [0, 0.0])
+                stats[0] += n
+                stats[1] += secs
+                done += n
+            now = time.perf_counter()
+            if now - last_report >= report_every:
+                last_report = now
+                print(f"{done}/{len(items)} files | {done / (now - t0):.1f} img/s")
+
+    elapsed = time.perf_counter() - t0
+    for pid, (n, secs) in sorted(per_worker.items()):
+        print(f"  worker {pid}: {n} files in {secs:.1f}s busy ({n / max(secs, 1e-9):.1f} img/s)")
+    print(f"{done} files in {elapsed:.1f}s ({done / max(elapsed, 1e-9):.1f} img/s, {workers} workers x {cv_threads} OpenCV threads)")
+    return written
 
 if __name__ == "__main__":
     ap = argparse.ArgumentParser()
-    ap.add_argument("--pipeline", required=True)
+    ap.add_argument("--pipeline", required=True, nargs="+",
+                    help="one or more PIPELINES names or specs like 'hist_eq|median(k=3)', or 'all'; "
+                         "each source is decoded once for all of them")
     ap.add_argument("--lists_dir", default="experiments/exp0_baseline/config")
     ap.add_argument("--out_root", default="data/enhanced")
+    ap.add_argument("--workers", type=int, default=1, help="process pool size; 1 keeps the serial path")
+    ap.add_argument("--chunk_size", type=int, default=16, help="paths per work unit in parallel mode")
+    ap.add_argument("--max_in_flight", type=int, default=None, help="max queued chunks (default 2 x workers)")
+    ap.add_argument("--threads", choices=THREAD_POLICIES, default="pool",
+                    help="parallel mode: pool = 1 OpenCV thread per worker, split = cores / workers, opencv = all cores each")
+    ap.add_argument("--no_cache", action="store_true", help="reprocess every input, ignoring the cache manifest")
+    ap.add_argument("--hash", action="store_true", help="key cache entries on source content hash instead of size+mtime")
+    ap.add_argument("--cache_max_gb", type=float, default=0, help="evict least-recently-used pipeline trees above this size (0 = no cap)")
     args = ap.parse_args()
 
-    fn = PIPELINES[args.pipeline]
-    out_root = os.path.join(args.out_root, args.pipeline)
+    names = []
+    for name in args.pipeline:
+        for n in (PIPELINES if name == "all" else [name]):
+            if n not in names:
+                names.append(n)
+    for name in names:
+        try:
+            parse_spec(name)
+        except (ValueError, SyntaxError) as e:
+            raise SystemExit(f"Bad pipeline {name!r}: {e} (PIPELINES: {', '.join(PIPELINES)})")
+
+    srcs = [src for lst in LIST_NAMES for src in read_list(os.path.join(args.lists_dir, lst))]
+    caches, keys = {}, {}
+    if args.no_cache:
+        items = [(src, tuple(names)) for src in srcs]
+    else:
+        for name in names:
+            caches[name] = EnhanceCache(os.path.join(args.out_root, spec_dirname(name)), pipeline_fingerprint(name), use_hash=args.hash)
+        items = []
+        for src in srcs:
+            try:
+                skey = source_key(src, args.hash)
+            except OSError:
+                items.append((src, tuple(names)))  # missing source; left to the normal skip path
+                continue
+            stale = []
+            for name in names:
+                keys[src, name] = caches[name].key(src, skey)
+                if not caches[name].is_fresh(rel_path(src), keys[src, name]):
+                    stale.append(name)
+            if stale:
+                items.append((src, tuple(stale)))
+        print(f"cache: {len(srcs) - len(items)} sources up to date, {len(items)} to process")
+
+    if args.workers > 1 and items:
+        written = process_items_parallel(items, args.out_root, args.workers,
+                                         chunk_size=args.chunk_size, max_in_flight=args.max_in_flight,
+                                         threads=args.threads)
+    else:
+        written = process_items(items, args.out_root)
 
-    names = ["train_benign.txt","train_malignant.txt","val_benign.txt","val_malignant.txt","test_benign.txt","test_malignant.txt"]
+    if caches:
+        for src, done_names in written:
+            for name in done_names:
+                if (src, name) in keys:
+                    caches[name].record(rel_path(src), keys[src, name])
+        for cache in caches.values():
+            cache.save()
+        if args.cache_max_gb > 0:
+            evict(args.out_root, int(args.cache_max_gb * 2**30), keep=tuple(map(spec_dirname, names)))
     for name in names:
-        process_list(os.path.join(args.lists_dir, name), out_root, fn)
-    print("Wrote enhanced images to:", out_root)
+        print("Wrote enhanced images to:", os.path.join(args.out_root, spec_dirname(name)))
@@ -1,6 +1,8 @@
 import os
 import pandas as pd
 from keras.preprocessing.image import ImageDataGenerator
+from src.utils.tensor_cache import MemmapSequence
+from src.utils.manifest import read_manifest
 
 def get_dataframe(path):
     filenames = []
@@ -11,6 +13,24 @@ def get_dataframe(path):
             labels.append(label)
     return pd.DataFrame({'filename': filenames, 'class': labels})
 
-def make_generator(df, batch_size=32, img_size=(128,128)):
+def get_dataframe_from_manifest(manifest, split):
+    # Canonical manifest rows (src/utils/manifest.py); no directory listing, works for every split mode
+    rows = read_manifest(manifest, split)
+    return pd.DataFrame({'filename': [r['path'] for r in rows], 'class': [r['label'] for r in rows]})
+
+def make_generator(df, batch_size=32, img_size=(128,128), shuffle=True, validate_filenames=True, classes=None):
     datagen = ImageDataGenerator(rescale=1./255)
-    return datagen.flow_from_dataframe(df, x_col='filename', y_col='class', target_size=img_size, color_mode='grayscale', class_mode='categorical', batch_size=batch_size)
+    return datagen.flow_from_dataframe(df, x_col='filename', y_col='class', target_size=img_size, color_mode='grayscale', class_mode='categorical', batch_size=batch_size, shuffle=shuffle, validate_filenames=validate_filenames, classes=classes)
+
+def manifest_classes(manifest):
+    # Sorted labels of every split, so a split missing a class keeps the same class_indices
+    return sorted({r['label'] for r in read_manifest(manifest)})
+
+def make_manifest_generator(manifest, split, batch_size=32, img_size=(128,128), shuffle=True):
+    # The manifest was written from files that existed, so skip flow_from_dataframe's per-file stat
+    return make_generator(get_dataframe_from_manifest(manifest, split), batch_size=batch_size, img_size=img_size,
+                          shuffle=shuffle, validate_filenames=False, classes=manifest_classes(manifest))
+
+def make_cached_generator(cache_dir, split, batch_size=32, shuffle=True):
+    # Same batches as make_generator, sliced from the materialized memmap (src/utils/tensor_cache.py)
+    return MemmapSequence(cache_dir, split, batch_size=batch_size, shuffle=shuffle)
@@ -0,0 +1,127 @@
+import os, json, time, shutil, hashlib, inspect
+from src.preprocessing import pipelines as _pipelines
+from src.preprocessing.pipeline_graph import STAGES, parse_spec, format_spec
+
+MANIFEST_NAME = ".cache_manifest.json"
+
+def _names(code):
+    # globals referenced by a code object and any lambdas/comprehensions nested in it
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if inspect.iscode(const):
+            names |= _names(const)
+    return names
+
+def _code_hash(fn, h, seen):
+    # Hash the function body plus any src.preprocessing helpers it calls,
+    # so editing e.g. pipelines.wiener also invalidates the wiener stage.
+    if fn in seen:
+        return
+    seen.add(fn)
+    h.update(inspect.getsource(fn).encode())
+    for name in sorted(_names(fn.__code__)):
+        for scope in (fn.__globals__, vars(_pipelines)):
+            obj = scope.get(name)
+            if inspect.isfunction(obj) and obj.__module__.startswith("src.preprocessing"):
+                _code_hash(obj, h, seen)
+
+def pipeline_fingerprint(pipeline):
+    """
+    Hash of the normalized stage chain (with parameters) and the code of every
+    stage in it. Named pipelines also hash their BATCH_PIPELINES form, which is
+    what apply_pipeline and the tensor cache run for them.
+    """
+    steps = parse_spec(pipeline)
+    h = hashlib.sha1()
+    h.update(format_spec(steps).encode())
+    seen = set()
+    for name, _ in steps:
+        _code_hash(STAGES[name].fn, h, seen)
+    if pipeline in _pipelines.BATCH_PIPELINES:
+        _code_hash(_pipelines.BATCH_PIPELINES[pipeline], h, seen)
+    return h.hexdigest()
+
+def source_key(src, use_hash=False):
+    if use_hash:
+        h = hashlib.sha1()
+        with open(src, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        return "sha1:" + h.hexdigest()
+    st = os.stat(src)
+    return f"stat:{st.st_size}:{st.st_mtime_ns}"
+
+class EnhanceCache:
+    """
+    On-disk manifest for one data/enhanced/<pipeline> tree.
+    An output is reused only if it exists and was produced from the same
+    source key under the same pipeline fingerprint (name, params, code).
+    """
+    def __init__(self, pipeline_root, fingerprint, use_hash=False):
+        self.root = pipeline_root
+        self.fingerprint = fingerprint
+        self.use_hash = use_hash
+        self.path = os.path.join(pipeline_root, MANIFEST_NAME)
+        self.entries = {}
+        if os.path.isfile(self.path):
+            try:
+                with open(self.path) as f:
+                    data = json.load(f)
+                self.entries = data.get("entries", {})
+            except (OSError, ValueError):
+                self.entries = {}
+
+    def key(self, src, src_key=None):
+        # src_key lets fused runs stat/hash a source once and share it across pipelines
+        return f"{self.fingerprint}|{src_key or source_key(src, self.use_hash)}"
+
+    def is_fresh(self, rel, key):
+        return self.entries.get(rel) == key and os.path.isfile(os.path.join(self.root, rel))
+
+    def record(self, rel, key):
+        self.entries[rel] = key
+
+    def save(self):
+        os.makedirs(self.root, exist_ok=True)
+        data = {"fingerprint": self.fingerprint, "last_used": time.time(),
+                "bytes": tree_bytes(self.root), "entries": self.entries}
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, self.path)
+
+def tree_bytes(root):
+    total = 0
+    for r, _, files in os.walk(root):
+        for f in files:
+            if f != MANIFEST_NAME:
+                total += os.path.getsize(os.path.join(r, f))
+    return total
+
+def evict(out_root, max_bytes, keep=()):
+    """Remove least-recently-used pipeline trees under out_root until they fit in max_bytes."""
+    trees = []
+    for name in os.listdir(out_root) if os.path.isdir(out_root) else []:
+        root = os.path.join(out_root, name)
+        man = os.path.join(root, MANIFEST_NAME)
+        if not os.path.isdir(root):
+            continue
+        last_used, size = 0.0, None
+        if os.path.isfile(man):
+            try:
+                with open(man) as f:
+                    data = json.load(f)
+                last_used, size = data.get("last_used", 0.0), data.get("bytes")
+            except (OSError, ValueError):
+                pass
+        trees.append([last_used, name, root, size if size is not None else tree_bytes(root)])
+    total = sum(t[3] for t in trees)
+    for last_used, name, root, size in sorted(trees):
+        if total <= max_bytes:
+            break
+        if name in keep:
+            continue
+        print(f"Evicting cached pipeline output: {root} ({size / 2**20:.1f} MiB)")
+        shutil.rmtree(root, ignore_errors=True)
+        total -= size
+    return total
@@ -0,0 +1,49 @@
+import os, re, csv, hashlib
+from PIL import Image
+
+# Canonical split manifest: one row per image, written by the split tools
+# (SplitWriter) and read by every loader instead of listing directories.
+COLUMNS = ["path", "label", "patient_id", "split", "width", "height", "sha1"]
+PATIENT_RE = re.compile(r"(P_\d{5})", re.IGNORECASE)
+
+def patient_id(path):
+    m = PATIENT_RE.search(path)
+    return m.group(1).upper() if m else ""
+
+def file_sha1(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def describe(path, label, split, pid=None, with_hash=False):
+    """Manifest row for one file. Width/height come from the image header only (no decode)."""
+    try:
+        with Image.open(path) as im:
+            width, height = im.size
+    except OSError:
+        width = height = ""
+    return {
+        "path": path,
+        "label": label,
+        "patient_id": pid if pid is not None else patient_id(path),
+        "split": split,
+        "width": width,
+        "height": height,
+        "sha1": file_sha1(path) if with_hash else "",
+    }
+
+def write_manifest(rows, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=COLUMNS, extrasaction="ignore")
+        w.writeheader()
+        w.writerows(rows)
+    os.replace(tmp, path)
+
+def read_manifest(path, split=None):
+    with open(path, newline="") as f:
+        rows = list(csv.DictReader(f))
+    return [r for r in rows if split is None or r["split"] == split]
@@ -0,0 +1,68 @@
+import os, shutil
+from src.utils.manifest import describe, write_manifest
+
+MODES = ("copy", "hardlink", "symlink", "reflink", "virtual")
+FICLONE = 0x40049409  # linux/fs.h: _IOW(0x94, 9, int)
+
+def _reflink(src, dst):
+    import fcntl
+    with open(src, "rb") as s, open(dst, "wb") as d:
+        fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+
+def place(src, dst, mode="copy"):
+    """
+    Put src at dst without copying bytes where the filesystem allows it.
+    hardlink and reflink fall back to a plain copy (e.g. across devices or on
+    filesystems without CoW); symlinks point at the absolute source path.
+    """
+    if mode == "hardlink":
+        try:
+            os.link(src, dst)
+            return
+        except OSError:
+            pass
+    elif mode == "symlink":
+        os.symlink(os.path.abspath(src), dst)
+        return
+    elif mode == "reflink":
+        try:
+            _reflink(src, dst)
+            return
+        except (OSError, ImportError):
+            if os.path.exists(dst):
+                os.remove(dst)
+    elif mode != "copy":
+        raise ValueError(f"Cannot place files with mode: {mode} (choose from {', '.join(MODES[:-1])})")
+    shutil.copy(src, dst)
+
+class SplitWriter:
+    """
+    Materializes <out_root>/<split>/<label>/<name> entries with the chosen mode
+    and records every entry in the canonical manifest (src/utils/manifest.py).
+    In 'virtual' mode nothing is placed on disk and the manifest points at the
+    sources, so rebuilding a split only costs the metadata write.
+    """
+    def __init__(self, out_root="data", mode="copy", manifest=None, with_hash=False):
+        if mode not in MODES:
+            raise ValueError(f"Unknown split mode: {mode} (choose from {', '.join(MODES)})")
+        self.out_root = out_root
+        self.mode = mode
+        self.manifest = os.path.join(out_root, "split_manifest.csv") if manifest is None else manifest
+        self.with_hash = with_hash
+        self.rows = []
+
+    def add(self, src, split, label, name=None, pid=None):
+        path = src
+        if self.mode != "virtual":
+            path = os.path.join(self.out_root, split, label, name or os.path.basename(src))
+            if not os.path.lexists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                place(src, path, self.mode)
+        if self.manifest:
+            self.rows.append(describe(path, label, split, pid=pid, with_hash=self.with_hash))
+
+    def close(self):
+        if not self.manifest:
+            return
+        write_manifest(self.rows, self.manifest)
+        print(f"Wrote split manifest ({len(self.rows)} entries, mode={self.mode}):", self.manifest)
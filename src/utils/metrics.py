@@ -1,8 +1,151 @@
-from sklearn.metrics import accuracy_score, recall_score, precision_score, f1_score, roc_auc_score
+import numpy as np
 
 def print_metrics(y_true, y_pred):
+    from sklearn.metrics import accuracy_score, recall_score, precision_score, f1_score, roc_auc_score
     print("Accuracy:", accuracy_score(y_true, y_pred))
     print("Recall:", recall_score(y_true, y_pred, average='macro'))
     print("Precision:", precision_score(y_true, y_pred, average='macro'))
     print("F1-score:", f1_score(y_true, y_pred, average='macro'))
     print("ROC AUC:", roc_auc_score(y_true, y_pred, multi_class='ovo'))
+
+class StreamingMetrics:
+    """
+    Classification metrics accumulated batch by batch (update(y_true, y_prob)).
+    Always kept, O(classes^2 + bins): confusion counts, loss sum, score
+    histograms of the positive class (ROC/PR curves and AUC/AP from `n_bins`
+    score bins) and top-label calibration bins.
+    exact=True also keeps each sample's positive-class score (4 bytes) and
+    label (1 byte), and curves/AUC/AP are then the exact sklearn values.
+    """
+    def __init__(self, num_classes=2, pos_label=1, n_bins=1000, cal_bins=10, exact=False, eps=1e-7):
+        self.num_classes = num_classes
+        self.pos_label = pos_label
+        self.n_bins = n_bins
+        self.exact = exact
+        self.eps = eps
+        self.cm = np.zeros((num_classes, num_classes), np.int64)
+        self.loss_sum = 0.0
+        self.hist = np.zeros((2, n_bins), np.int64)  # [negative, positive] counts per positive-score bin
+        self.cal_count = np.zeros(cal_bins, np.int64)
+        self.cal_conf = np.zeros(cal_bins)
+        self.cal_correct = np.zeros(cal_bins)
+        self._scores, self._labels = [], []
+
+    @property
+    def count(self):
+        return int(self.cm.sum())
+
+    def update(self, y_true, y_prob):
+        """y_true: class indices or one-hot rows; y_prob: (n, num_classes) probabilities."""
+        y_prob = np.asarray(y_prob, dtype=np.float64)
+        y_true = np.asarray(y_true)
+        if y_true.ndim == 2:
+            y_true = y_true.argmax(axis=1)
+        y_true = y_true.astype(np.int64)
+        y_pred = y_prob.argmax(axis=1)
+        self.cm += np.bincount(y_true * self.num_classes + y_pred, minlength=self.num_classes ** 2).reshape(self.cm.shape)
+        # categorical cross-entropy as Keras computes it: normalize, clip, -log p[true]
+        p = np.clip(y_prob / y_prob.sum(axis=1, keepdims=True), self.eps, 1 - self.eps)
+        self.loss_sum += -np.log(p[np.arange(len(y_true)), y_true]).sum()
+        pos = y_true == self.pos_label
+        score = y_prob[:, self.pos_label]
+        b = np.clip((score * self.n_bins).astype(np.int64), 0, self.n_bins - 1)
+        self.hist += np.stack([np.bincount(b[~pos], minlength=self.n_bins), np.bincount(b[pos], minlength=self.n_bins)])
+        conf = y_prob.max(axis=1)
+        cb = np.clip((conf * len(self.cal_count)).astype(np.int64), 0, len(self.cal_count) - 1)
+        self.cal_count += np.bincount(cb, minlength=len(self.cal_count))
+        self.cal_conf += np.bincount(cb, weights=conf, minlength=len(self.cal_count))
+        self.cal_correct += np.bincount(cb, weights=(y_pred == y_true), minlength=len(self.cal_count))
+        if self.exact:
+            self._scores.append(score.astype(np.float32))
+            self._labels.append(pos.astype(np.int8))
+
+    # -------- scalar metrics --------
+
+    def loss(self):
+        return float(self.loss_sum) / max(self.count, 1)
+
+    def accuracy(self):
+        return float(np.trace(self.cm)) / max(self.count, 1)
+
+    def per_class(self):
+        """(precision, recall, f1, support) arrays from the confusion counts."""
+        tp = np.diag(self.cm).astype(np.float64)
+        support = self.cm.sum(axis=1)
+        predicted = self.cm.sum(axis=0)
+        precision = np.divide(tp, predicted, out=np.zeros_like(tp), where=predicted > 0)
+        recall = np.divide(tp, support, out=np.zeros_like(tp), where=support > 0)
+        denom = precision + recall
+        f1 = np.divide(2 * precision * recall, denom, out=np.zeros_like(tp), where=denom > 0)
+        return precision, recall, f1, support
+
+    # -------- curves --------
+
+    def _counts(self):
+        """Cumulative (fps, tps, thresholds) from the highest score down, one point per distinct score / bin."""
+        if self.exact and self._scores:
+            s = np.concatenate(self._scores).astype(np.float64)
+            y = np.concatenate(self._labels)
+            order = np.argsort(-s, kind="mergesort")
+            s, y = s[order], y[order]
+            last = np.r_[np.flatnonzero(np.diff(s)), len(s) - 1]  # last index of each distinct score
+            tps = np.cumsum(y)[last]
+            return (last + 1) - tps, tps, s[last]
+        neg, pos = self.hist[0, ::-1], self.hist[1, ::-1]
+        keep = (neg + pos) > 0
+        thresholds = (np.arange(self.n_bins)[::-1] / self.n_bins)[keep]  # lower edge of each non-empty bin
+        return np.cumsum(neg)[keep], np.cumsum(pos)[keep], thresholds
+
+    def roc_curve(self):
+        """(fpr, tpr, thresholds), starting at (0, 0) with threshold inf like sklearn."""
+        fps, tps, thr = self._counts()
+        fps, tps = np.r_[0, fps], np.r_[0, tps]
+        return fps / max(fps[-1], 1), tps / max(tps[-1], 1), np.r_[np.inf, thr]
+
+    def roc_auc(self):
+        """Trapezoidal area under roc_curve(); scores sharing a bin count as ties."""
+        fpr, tpr, _ = self.roc_curve()
+        return float(np.sum(np.diff(fpr) * (tpr[1:] + tpr[:-1])) / 2)
+
+    def pr_curve(self):
+        """(precision, recall, thresholds) in decreasing-threshold order."""
+        fps, tps, thr = self._counts()
+        precision = tps / np.maximum(tps + fps, 1)
+        recall = tps / max(tps[-1], 1) if len(tps) else tps
+        return precision, recall, thr
+
+    def average_precision(self):
+        precision, recall, _ = self.pr_curve()
+        return float(np.sum(np.diff(np.r_[0, recall]) * precision))
+
+    def calibration(self):
+        """Per confidence bin: (count, mean confidence, accuracy) and the expected calibration error."""
+        n = np.maximum(self.cal_count, 1)
+        conf, acc = self.cal_conf / n, self.cal_correct / n
+        ece = float(np.sum(self.cal_count * np.abs(conf - acc)) / max(self.count, 1))
+        return {"count": self.cal_count.tolist(), "confidence": conf.tolist(), "accuracy": acc.tolist(), "ece": ece}
+
+    # -------- summaries --------
+
+    def report(self, class_names=None, digits=4):
+        """Text table laid out like sklearn's classification_report, from the confusion counts."""
+        names = class_names or [str(i) for i in range(self.num_classes)]
+        precision, recall, f1, support = self.per_class()
+        total = support.sum()
+        width = max(len("weighted avg"), max(len(n) for n in names))
+        head = f"{'':>{width}} {'precision':>9} {'recall':>9} {'f1-score':>9} {'support':>9}\n\n"
+        row = lambda name, p, r, f, s: f"{name:>{width}} {p:>9.{digits}f} {r:>9.{digits}f} {f:>9.{digits}f} {s:>9}\n"
+        lines = [head] + [row(n, p, r, f, s) for n, p, r, f, s in zip(names, precision, recall, f1, support)]
+        lines.append("\n" + f"{'accuracy':>{width}} {'':>9} {'':>9} {self.accuracy():>9.{digits}f} {total:>9}\n")
+        w = support / max(total, 1)
+        lines.append(row("macro avg", precision.mean(), recall.mean(), f1.mean(), total))
+        lines.append(row("weighted avg", (precision * w).sum(), (recall * w).sum(), (f1 * w).sum(), total))
+        return "".join(lines)
+
+    def result(self):
+        out = {"count": self.count, "loss": self.loss(), "accuracy": self.accuracy(),
+               "confusion": self.cm.tolist(), "exact": bool(self.exact and self._scores)}
+        if self.hist[0].sum() and self.hist[1].sum():
+            out.update(roc_auc=self.roc_auc(), average_precision=self.average_precision())
+        out["ece"] = self.calibration()["ece"]
+        return out
@@ -0,0 +1,144 @@
+import os, json, time, resource, subprocess
+from contextlib import contextmanager
+
+# Per-stage resource accounting for run_experiment.py. Subprocess stages are
+# waited on with WNOWAIT so the finished child's /proc/<pid>/io can still be
+# read, then reaped with os.wait4 for its rusage (CPU, peak RSS, block IO;
+# Linux folds reaped grandchildren into both). In-process stages use
+# getrusage/proc deltas of this process. A child's ru_maxrss starts at this
+# process's RSS at spawn (Linux keeps the high-water mark across fork/exec),
+# so subprocess stages also record parent_rss_bytes. Results go to timings.json and,
+# optionally, a Chrome trace (chrome://tracing or https://ui.perfetto.dev).
+
+IO_FIELDS = ("rchar", "wchar", "syscr", "syscw", "read_bytes", "write_bytes")
+
+def read_io(pid="self"):
+    """/proc/<pid>/io counters as a dict ({} where unavailable)."""
+    try:
+        with open(f"/proc/{pid}/io") as f:
+            rows = dict(line.split(":") for line in f if ":" in line)
+        return {k: int(rows[k]) for k in IO_FIELDS if k in rows}
+    except (OSError, ValueError):
+        return {}
+
+def _rss_hwm():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def _rss_now():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+def _reset_hwm():
+    # writing 5 to clear_refs resets VmHWM (Linux >= 4.0); otherwise the peak is since process start
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+def count_new_files(paths, since):
+    """Files under `paths` (files or dirs) modified at or after `since` (epoch seconds)."""
+    n = 0
+    for path in paths:
+        if os.path.isfile(path):
+            n += os.stat(path).st_mtime >= since
+            continue
+        for root, _, files in os.walk(path):
+            for f in files:
+                try:
+                    n += os.stat(os.path.join(root, f)).st_mtime >= since
+                except OSError:
+                    pass
+    return n
+
+class Profiler:
+    def __init__(self):
+        self.stages = []
+        self.t0 = time.time()
+
+    def _record(self, name, start, wall, cpu_user, cpu_sys, rss, io, outputs, files_read, extra=None):
+        stage = {"name": name, "start": start - self.t0, "wall_s": wall, "cpu_user_s": cpu_user, "cpu_sys_s": cpu_sys,
+                 "cpu_util": (cpu_user + cpu_sys) / max(wall, 1e-9), "peak_rss_bytes": rss, "io": io,
+                 "files_written": count_new_files(outputs, start) if outputs else None, "files_read": files_read}
+        stage.update(extra or {})
+        self.stages.append(stage)
+        print(f"[profile] {name}: {wall:.1f}s wall, {cpu_user + cpu_sys:.1f}s CPU, "
+              f"peak RSS {rss / 2**20:.0f} MiB, read {io.get('rchar', 0) / 2**20:.0f} MiB, "
+              f"wrote {io.get('wchar', 0) / 2**20:.0f} MiB")
+        return stage
+
+    def run(self, name, cmd, outputs=(), files_read=None):
+        """Run shell command `cmd` as stage `name`; raises SystemExit with its exit code on failure."""
+        print(">>", cmd)
+        start, t, parent_rss = time.time(), time.perf_counter(), _rss_now()
+        proc = subprocess.Popen(cmd, shell=True)
+        os.waitid(os.P_PID, proc.pid, os.WEXITED | os.WNOWAIT)
+        io = read_io(proc.pid)
+        _, status, ru = os.wait4(proc.pid, 0)
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        wall = time.perf_counter() - t
+        stage = self._record(name, start, wall, ru.ru_utime, ru.ru_stime, ru.ru_maxrss * 1024, io, outputs, files_read,
+                             {"kind": "subprocess", "cmd": cmd, "returncode": proc.returncode, "parent_rss_bytes": parent_rss,
+                              "block_in": ru.ru_inblock, "block_out": ru.ru_oublock})
+        if proc.returncode != 0:
+            raise SystemExit(proc.returncode)
+        return stage
+
+    @contextmanager
+    def stage(self, name, outputs=(), files_read=None):
+        """Profile the body of a `with` block as stage `name` (this process only)."""
+        _reset_hwm()
+        start, t = time.time(), time.perf_counter()
+        ru0, io0 = resource.getrusage(resource.RUSAGE_SELF), read_io()
+        extra = {"kind": "inprocess"}
+        try:
+            yield extra  # the body may add fields, e.g. extra["epochs"]
+        finally:
+            wall = time.perf_counter() - t
+            ru1, io1 = resource.getrusage(resource.RUSAGE_SELF), read_io()
+            io = {k: io1[k] - io0.get(k, 0) for k in io1}
+            extra.update(block_in=ru1.ru_inblock - ru0.ru_inblock, block_out=ru1.ru_oublock - ru0.ru_oublock)
+            self._record(name, start, wall, ru1.ru_utime - ru0.ru_utime, ru1.ru_stime - ru0.ru_stime,
+                         _rss_hwm(), io, outputs, files_read, extra)
+
+    def attach_epochs(self, stage_name, epoch_file):
+        """Add per-epoch rows written by train.py's EpochTimer to a finished stage."""
+        if not os.path.exists(epoch_file):
+            return
+        with open(epoch_file) as f:
+            epochs = json.load(f)
+        for stage in self.stages:
+            if stage["name"] == stage_name:
+                stage["epochs"] = epochs
+
+    def summary(self):
+        return {s["name"]: round(s["wall_s"], 2) for s in self.stages}
+
+    def chrome_trace(self):
+        """Chrome trace events: stages on one track, training epochs on a second."""
+        events = [{"name": "process_name", "ph": "M", "pid": 1, "args": {"name": "experiment"}}]
+        for s in self.stages:
+            args = {k: v for k, v in s.items() if k not in ("name", "start", "epochs")}
+            events.append({"name": s["name"], "ph": "X", "pid": 1, "tid": 1,
+                           "ts": s["start"] * 1e6, "dur": s["wall_s"] * 1e6, "args": args})
+            for e in s.get("epochs", []):
+                events.append({"name": f"epoch {e['epoch']}", "ph": "X", "pid": 1, "tid": 2,
+                               "ts": (e["start"] - self.t0) * 1e6, "dur": e["wall_s"] * 1e6, "args": e})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def save(self, exp_dir, trace=False):
+        with open(os.path.join(exp_dir, "timings.json"), "w") as f:
+            json.dump({"started": time.ctime(self.t0), "total_s": time.time() - self.t0, "stages": self.stages}, f, indent=2)
+        if trace:
+            with open(os.path.join(exp_dir, "logs", "trace.json"), "w") as f:
+                json.dump(self.chrome_trace(), f)
@@ -0,0 +1,182 @@
+import os, json, argparse
+import cv2
+import numpy as np
+import pandas as pd
+from keras.utils import Sequence
+from src.utils.manifest import read_manifest
+from src.preprocessing.pipelines import BATCH_PIPELINES, BUFFERS
+from src.preprocessing.pipeline_graph import compile_spec
+
+SPLITS = ["train", "val", "test"]
+CLASSES = ["benign", "malignant"]  # sorted, same class indices as flow_from_directory
+IMG_EXTS = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff")
+
+def load_resized(path, img_size=(128,128)):
+    # Grayscale + nearest resize, matching flow_from_directory defaults
+    # (INTER_NEAREST_EXACT is OpenCV's PIL-compatible nearest neighbour).
+    img = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+    if img is None:
+        return None
+    return cv2.resize(img, (img_size[1], img_size[0]), interpolation=cv2.INTER_NEAREST_EXACT)
+
+def enhance_resize(imgs, img_size=(128,128), pipeline=None):
+    """
+    Decoded grayscale images -> model-size uint8 images (None stays None).
+    With a pipeline name/spec, it runs on the full-resolution images before
+    the resize, like enhancing into data/enhanced first; named pipelines use
+    their BATCH_PIPELINES form over the whole block.
+    """
+    ok = [i for i, img in enumerate(imgs) if img is not None]
+    bufs = []
+    if pipeline is None:
+        enhanced = [imgs[i] for i in ok]
+    elif pipeline in BATCH_PIPELINES:
+        bufs = [BUFFERS.take(imgs[i].shape) for i in ok]
+        enhanced = BATCH_PIPELINES[pipeline]([imgs[i] for i in ok], out=bufs)
+    else:
+        fn = compile_spec(pipeline)
+        enhanced = [fn(imgs[i]) for i in ok]
+    out = [None] * len(imgs)
+    for i, img in zip(ok, enhanced):
+        out[i] = cv2.resize(img, (img_size[1], img_size[0]), interpolation=cv2.INTER_NEAREST_EXACT)
+    BUFFERS.give(*bufs)
+    return out
+
+def load_block(paths, img_size=(128,128), pipeline=None):
+    """load_resized for a block of paths (None for unreadable files), optionally enhanced (see enhance_resize)."""
+    if pipeline is None:
+        return [load_resized(p, img_size) for p in paths]
+    return enhance_resize([cv2.imread(p, cv2.IMREAD_GRAYSCALE) for p in paths], img_size, pipeline)
+
+def list_split_dir(split_dir):
+    """[(path, class_name)] for <split_dir>/<class>/*, in flow_from_directory order."""
+    rows = []
+    for cls in CLASSES:
+        d = os.path.join(split_dir, cls)
+        if not os.path.isdir(d):
+            continue
+        for f in sorted(os.listdir(d)):
+            if f.lower().endswith(IMG_EXTS):
+                rows.append((os.path.join(d, f), cls))
+    return rows
+
+def list_from_lists(lists_dir, split, source_root="data/preprocessed"):
+    """Same rows straight from <split>_<class>.txt lists, re-rooted under source_root (no copying)."""
+    rows = []
+    for cls in CLASSES:
+        with open(os.path.join(lists_dir, f"{split}_{cls}.txt")) as f:
+            for src in [l.strip() for l in f if l.strip()]:
+                rel = os.path.relpath(src, start="data/preprocessed")
+                rows.append((os.path.join(source_root, rel), cls))
+    return rows
+
+def list_from_manifest(manifest, split):
+    """Rows of the canonical split manifest (src/utils/manifest.py), without listing directories."""
+    return [(r["path"], r["label"]) for r in read_manifest(manifest, split)]
+
+def pack_split(rows, out_dir, split, img_size=(128,128), shard_size=4096, pipeline=None, block=64):
+    """
+    Decode + resize every image once and write them into <split>-NNNNN.npy shards
+    of shape (n, H, W, 1) uint8, `block` images at a time (see load_block).
+    Returns index rows (split, shard, offset, label, path).
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    index = []
+    for s, start in enumerate(range(0, len(rows), shard_size)):
+        chunk = rows[start:start+shard_size]
+        name = f"{split}-{s:05d}.npy"
+        arr = np.lib.format.open_memmap(os.path.join(out_dir, name), mode="w+", dtype=np.uint8,
+                                        shape=(len(chunk), img_size[0], img_size[1], 1))
+        n = 0
+        for b in range(0, len(chunk), block):
+            part = chunk[b:b+block]
+            for (path, cls), img in zip(part, load_block([p for p, _ in part], img_size, pipeline)):
+                if img is None:
+                    print("Skipping unreadable image:", path)
+                    continue
+                arr[n, :, :, 0] = img
+                index.append({"split": split, "shard": name, "offset": n, "label": CLASSES.index(cls), "path": path})
+                n += 1
+        arr.flush()
+        del arr
+        if n < len(chunk):
+            # unreadable files left a tail; rewrite the shard at its real length
+            full = np.load(os.path.join(out_dir, name), mmap_mode="r")[:n].copy()
+            np.save(os.path.join(out_dir, name), full)
+    return index
+
+def pack(out_dir, split_rows, img_size=(128,128), shard_size=4096, pipeline=None):
+    index = []
+    for split, rows in split_rows.items():
+        index += pack_split(rows, out_dir, split, img_size, shard_size, pipeline)
+        print(f"{split}: packed {sum(r['split'] == split for r in index)} images")
+    pd.DataFrame(index, columns=["split", "shard", "offset", "label", "path"]).to_csv(
+        os.path.join(out_dir, "index.csv"), index=False)
+    with open(os.path.join(out_dir, "meta.json"), "w") as f:
+        json.dump({"img_size": list(img_size), "classes": CLASSES, "pipeline": pipeline}, f, indent=2)
+
+class ShardSequence(Sequence):
+    """
+    Keras Sequence over packed shards. Shards are opened with mmap_mode='r' so
+    several training processes share the page cache instead of each decoding
+    JPEGs. Exposes classes/class_indices like a DirectoryIterator.
+    """
+    def __init__(self, shard_dir, split, batch_size=32, shuffle=True, seed=None):
+        with open(os.path.join(shard_dir, "meta.json")) as f:
+            meta = json.load(f)
+        index = pd.read_csv(os.path.join(shard_dir, "index.csv"))
+        index = index[index["split"] == split].reset_index(drop=True)
+        names = sorted(index["shard"].unique())
+        self.shards = [np.load(os.path.join(shard_dir, n), mmap_mode="r") for n in names]
+        self.shard_ids = index["shard"].map({n: i for i, n in enumerate(names)}).to_numpy()
+        self.offsets = index["offset"].to_numpy()
+        self.classes = index["label"].to_numpy()
+        self.filenames = index["path"].tolist()
+        self.class_indices = {c: i for i, c in enumerate(meta["classes"])}
+        self.num_classes = len(meta["classes"])
+        self.image_shape = tuple(meta["img_size"]) + (1,)
+        self.samples = len(index)
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.rng = np.random.default_rng(seed)
+        self.order = np.arange(self.samples)
+        self.on_epoch_end()
+
+    def __len__(self):
+        return (self.samples + self.batch_size - 1) // self.batch_size
+
+    def __getitem__(self, i):
+        idx = self.order[i * self.batch_size:(i + 1) * self.batch_size]
+        x = np.empty((len(idx),) + self.image_shape, dtype=np.float32)
+        sid, off = self.shard_ids[idx], self.offsets[idx]
+        for s in np.unique(sid):
+            m = sid == s
+            x[m] = self.shards[s][off[m]]
+        x *= np.float32(1. / 255)
+        y = np.eye(self.num_classes, dtype=np.float32)[self.classes[idx]]
+        return x, y
+
+    def on_epoch_end(self):
+        if self.shuffle:
+            self.rng.shuffle(self.order)
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--out_dir", default="data/shards")
+    ap.add_argument("--split_root", default="data", help="root holding train/val/test/<class> folders")
+    ap.add_argument("--lists_dir", default=None, help="pack straight from list files instead of split folders")
+    ap.add_argument("--manifest", default=None, help="pack from a split manifest CSV instead of split folders")
+    ap.add_argument("--source_root", default="data/preprocessed", help="with --lists_dir: data/preprocessed or data/enhanced/<pipeline>")
+    ap.add_argument("--img_size", type=int, nargs=2, default=[128,128])
+    ap.add_argument("--shard_size", type=int, default=4096, help="images per shard file")
+    ap.add_argument("--pipeline", default=None, help="enhance while packing (PIPELINES name or spec) instead of reading data/enhanced")
+    args = ap.parse_args()
+
+    if args.manifest:
+        split_rows = {sp: list_from_manifest(args.manifest, sp) for sp in SPLITS}
+    elif args.lists_dir:
+        split_rows = {sp: list_from_lists(args.lists_dir, sp, args.source_root) for sp in SPLITS}
+    else:
+        split_rows = {sp: list_split_dir(os.path.join(args.split_root, sp)) for sp in SPLITS}
+    pack(args.out_dir, split_rows, tuple(args.img_size), args.shard_size, args.pipeline)
+    print("Wrote shards to:", args.out_dir)
@@ -0,0 +1,103 @@
+import os, json, argparse
+import numpy as np
+from keras.utils import Sequence
+from src.utils.shards import SPLITS, CLASSES, load_block, list_split_dir, list_from_lists, list_from_manifest
+
+def materialize_split(rows, cache_dir, split, img_size=(128,128), seed=42, pipeline=None, block=64):
+    """
+    Decode + resize a split once into <split>_x.u8, a raw np.memmap of shape
+    (N, H, W, 1) uint8, plus <split>_y.npy labels. Rows are written in a fixed
+    shuffled order so batches can later be read as contiguous slices. Images
+    are loaded `block` at a time, optionally enhanced (see shards.load_block).
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    rows = list(rows)
+    np.random.default_rng(seed).shuffle(rows)
+    shape = (len(rows), img_size[0], img_size[1], 1)
+    x = np.memmap(os.path.join(cache_dir, f"{split}_x.u8"), dtype=np.uint8, mode="w+", shape=shape) if rows else None
+    labels, paths = [], []
+    for b in range(0, len(rows), block):
+        part = rows[b:b+block]
+        for (path, cls), img in zip(part, load_block([p for p, _ in part], img_size, pipeline)):
+            if img is None:
+                print("Skipping unreadable image:", path)
+                continue
+            x[len(labels), :, :, 0] = img
+            labels.append(CLASSES.index(cls))
+            paths.append(path)
+    if x is not None:
+        x.flush()
+        del x
+    np.save(os.path.join(cache_dir, f"{split}_y.npy"), np.array(labels, dtype=np.int64))
+    with open(os.path.join(cache_dir, f"{split}_paths.txt"), "w") as f:
+        f.write("\n".join(paths) + ("\n" if paths else ""))
+    return {"count": len(labels), "rows": len(rows)}
+
+def materialize(cache_dir, split_rows, img_size=(128,128), seed=42, pipeline=None, key=None):
+    # key: optional caller fingerprint of the inputs, stored so a later run can tell the cache is current
+    meta = {"img_size": list(img_size), "classes": CLASSES, "pipeline": pipeline, "key": key, "splits": {}}
+    for split, rows in split_rows.items():
+        meta["splits"][split] = materialize_split(rows, cache_dir, split, img_size, seed, pipeline)
+        print(f"{split}: cached {meta['splits'][split]['count']} images")
+    with open(os.path.join(cache_dir, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+
+class MemmapSequence(Sequence):
+    """
+    Batches are contiguous slices of the split memmap (zero-copy views); the
+    /255 rescale is one vectorized multiply per batch. Shuffling permutes the
+    batch order each epoch; sample order was shuffled once at materialization.
+    """
+    def __init__(self, cache_dir, split, batch_size=32, shuffle=True, seed=None):
+        with open(os.path.join(cache_dir, "meta.json")) as f:
+            meta = json.load(f)
+        info = meta["splits"][split]
+        shape = (info["rows"], meta["img_size"][0], meta["img_size"][1], 1)
+        x = np.memmap(os.path.join(cache_dir, f"{split}_x.u8"), dtype=np.uint8, mode="r", shape=shape)
+        self.x = x[:info["count"]]
+        self.classes = np.load(os.path.join(cache_dir, f"{split}_y.npy"))
+        with open(os.path.join(cache_dir, f"{split}_paths.txt")) as f:
+            self.filenames = [l.rstrip("\n") for l in f if l.strip()]
+        self.class_indices = {c: i for i, c in enumerate(meta["classes"])}
+        self.num_classes = len(meta["classes"])
+        self.samples = info["count"]
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.rng = np.random.default_rng(seed)
+        self.batch_order = np.arange(len(self))
+        self.on_epoch_end()
+
+    def __len__(self):
+        return (self.samples + self.batch_size - 1) // self.batch_size
+
+    def __getitem__(self, i):
+        b = self.batch_order[i]
+        sl = slice(b * self.batch_size, (b + 1) * self.batch_size)
+        x = np.multiply(self.x[sl], np.float32(1. / 255), dtype=np.float32)
+        y = np.eye(self.num_classes, dtype=np.float32)[self.classes[sl]]
+        return x, y
+
+    def on_epoch_end(self):
+        if self.shuffle:
+            self.rng.shuffle(self.batch_order)
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--out_dir", default="data/tensor_cache")
+    ap.add_argument("--split_root", default="data", help="root holding train/val/test/<class> folders")
+    ap.add_argument("--lists_dir", default=None, help="materialize straight from list files instead of split folders")
+    ap.add_argument("--manifest", default=None, help="materialize from a split manifest CSV instead of split folders")
+    ap.add_argument("--source_root", default="data/preprocessed", help="with --lists_dir: data/preprocessed or data/enhanced/<pipeline>")
+    ap.add_argument("--img_size", type=int, nargs=2, default=[128,128])
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--pipeline", default=None, help="enhance while materializing (PIPELINES name or spec) instead of reading data/enhanced")
+    args = ap.parse_args()
+
+    if args.manifest:
+        split_rows = {sp: list_from_manifest(args.manifest, sp) for sp in SPLITS}
+    elif args.lists_dir:
+        split_rows = {sp: list_from_lists(args.lists_dir, sp, args.source_root) for sp in SPLITS}
+    else:
+        split_rows = {sp: list_split_dir(os.path.join(args.split_root, sp)) for sp in SPLITS}
+    materialize(args.out_dir, split_rows, tuple(args.img_size), args.seed, args.pipeline)
+    print("Wrote tensor cache to:", args.out_dir)
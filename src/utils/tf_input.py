@@ -0,0 +1,67 @@
+import os
+import tensorflow as tf
+from src.utils.manifest import read_manifest
+
+# Formats tf.io.decode_image understands; flow_from_directory also reads these
+TF_IMG_EXTS = (".jpg", ".jpeg", ".png", ".bmp")
+
+def list_class_dir(directory):
+    """
+    Paths, integer labels and class_indices using the same mapping as
+    flow_from_directory (sorted sub-folder names), so saved models stay compatible.
+    """
+    class_names = sorted(d for d in os.listdir(directory) if os.path.isdir(os.path.join(directory, d)))
+    class_indices = {c: i for i, c in enumerate(class_names)}
+    paths, labels = [], []
+    for c in class_names:
+        for root, _, files in os.walk(os.path.join(directory, c)):
+            for f in sorted(files):
+                if f.lower().endswith(TF_IMG_EXTS):
+                    paths.append(os.path.join(root, f))
+                    labels.append(class_indices[c])
+    return paths, labels, class_indices
+
+def make_dataset(directory, img_size=(128,128), batch_size=32, shuffle=True, cache=True, seed=None):
+    """
+    list files -> parallel decode/resize -> cache -> shuffle -> batch -> prefetch.
+    Decoding runs on tf.data's thread pool instead of the Python thread, and the
+    cache holds uint8 tensors so epochs after the first skip decoding entirely.
+    Returns (dataset, class_indices, n_samples).
+    """
+    paths, labels, class_indices = list_class_dir(directory)
+    return _build(paths, labels, class_indices, img_size, batch_size, shuffle, cache, seed)
+
+def make_dataset_from_manifest(manifest, split, img_size=(128,128), batch_size=32, shuffle=True, cache=True, seed=None):
+    """
+    Same pipeline fed from the canonical split manifest; the directory tree is never listed.
+    class_indices come from the labels of every split, so ids agree across splits
+    even when one of them lacks a class.
+    """
+    all_rows = read_manifest(manifest)
+    class_indices = {c: i for i, c in enumerate(sorted({r["label"] for r in all_rows}))}
+    rows = [r for r in all_rows if r["split"] == split]
+    paths = [r["path"] for r in rows]
+    labels = [class_indices[r["label"]] for r in rows]
+    return _build(paths, labels, class_indices, img_size, batch_size, shuffle, cache, seed)
+
+def _build(paths, labels, class_indices, img_size, batch_size, shuffle, cache, seed):
+    n_classes = len(class_indices)
+
+    def load(path, label):
+        img = tf.io.decode_image(tf.io.read_file(path), channels=1, expand_animations=False)
+        img = tf.image.resize(img, img_size, method="nearest")  # same interpolation as flow_from_directory
+        return tf.cast(img, tf.uint8), label
+
+    def to_model_inputs(img, label):
+        return tf.cast(img, tf.float32) / 255., tf.one_hot(label, n_classes)
+
+    ds = tf.data.Dataset.from_tensor_slices((paths, labels))
+    ds = ds.map(load, num_parallel_calls=tf.data.AUTOTUNE, deterministic=not shuffle)
+    if cache:
+        ds = ds.cache()
+    if shuffle:
+        ds = ds.shuffle(len(paths), seed=seed, reshuffle_each_iteration=True)
+    ds = ds.batch(batch_size)
+    ds = ds.map(to_model_inputs, num_parallel_calls=tf.data.AUTOTUNE)
+    ds = ds.prefetch(tf.data.AUTOTUNE)
+    return ds, class_indices, len(paths)
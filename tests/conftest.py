@@ -0,0 +1,4 @@
+import os, sys
+
+# Ensure repo root on path so tests import src.* like the scripts do
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
@@ -0,0 +1,56 @@
+import sys, time, threading
+import numpy as np
+from src.preprocessing.pipelines import BufferPool, TransferCache
+
+def _hammer(fn, threads=8):
+    # switch threads every few bytecodes so unlocked read-modify-write sequences interleave
+    old = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        return _run_threads(fn, threads)
+    finally:
+        sys.setswitchinterval(old)
+
+def _run_threads(fn, threads):
+    errors = []
+    def run(t):
+        try:
+            fn(t)
+        except AssertionError as e:
+            errors.append(e)
+    ts = [threading.Thread(target=run, args=(t,)) for t in range(threads)]
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+    return errors
+
+def test_buffer_pool_never_hands_one_buffer_to_two_threads():
+    pool = BufferPool(round_to=1 << 12)
+    in_use, lock = set(), threading.Lock()
+    def work(t):
+        for i in range(2000):
+            buf = pool.take((32, 32 + i % 7))
+            with lock:
+                assert id(buf.base) not in in_use, "buffer handed to two threads"
+                in_use.add(id(buf.base))
+            buf.fill(t)
+            time.sleep(0)  # let other threads run while this one holds the buffer
+            assert (buf == t).all(), "buffer written by another thread"
+            with lock:
+                in_use.discard(id(buf.base))
+            pool.give(buf)
+    assert not _hammer(work)
+    bases = [id(b) for b in pool._free]
+    assert len(bases) == len(set(bases))
+    assert pool.bytes == sum(b.nbytes for b in pool._free)
+
+def test_transfer_cache_consistent_under_threads():
+    cache = TransferCache(max_bytes=64 << 10)
+    def work(t):
+        for i in range(300):
+            key = i % 13
+            W = cache.get(key, lambda: np.full(512, key, np.complex64))
+            assert (W == key).all()
+    assert not _hammer(work)
+    assert cache.bytes == sum(W.nbytes for W in cache._entries.values()) <= cache.max_bytes
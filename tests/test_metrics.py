@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+from src.utils.metrics import StreamingMetrics
+
+def _reference_auc(y, s):
+    # Mann-Whitney: P(score_pos > score_neg) + 0.5 * P(tie), over all pairs
+    pos, neg = s[y == 1][:, None], s[y == 0][None, :]
+    return float(((pos > neg) + 0.5 * (pos == neg)).mean())
+
+def _reference_ap(y, s):
+    # sum over distinct thresholds (high to low) of (recall step) * precision
+    ap, prev_recall = 0.0, 0.0
+    for t in np.unique(s)[::-1]:
+        sel = s >= t
+        tp = (y[sel] == 1).sum()
+        recall = tp / (y == 1).sum()
+        ap += (recall - prev_recall) * tp / sel.sum()
+        prev_recall = recall
+    return float(ap)
+
+@pytest.fixture(scope="module")
+def data():
+    rng = np.random.default_rng(0)
+    y = rng.integers(0, 2, 3000)
+    s = np.clip(rng.normal(0.35 + 0.3 * y, 0.2), 0, 1).round(3).astype(np.float32)  # rounded: plenty of ties
+    return y, s, np.stack([1 - s, s], axis=1)
+
+def _fill(metrics, y, probs, batch=64, onehot=False):
+    for i in range(0, len(y), batch):
+        labels = np.eye(2)[y[i:i+batch]] if onehot else y[i:i+batch]
+        metrics.update(labels, probs[i:i+batch])
+    return metrics
+
+def test_exact_matches_reference(data):
+    y, s, probs = data
+    m = _fill(StreamingMetrics(exact=True), y, probs)
+    assert m.roc_auc() == pytest.approx(_reference_auc(y, s), abs=1e-12)
+    assert m.average_precision() == pytest.approx(_reference_ap(y, s), abs=1e-12)
+
+def test_binned_close_to_reference(data):
+    y, s, probs = data
+    m = _fill(StreamingMetrics(n_bins=1000), y, probs, onehot=True)
+    assert m.roc_auc() == pytest.approx(_reference_auc(y, s), abs=1e-3)
+    assert m.average_precision() == pytest.approx(_reference_ap(y, s), abs=5e-3)
+    assert m.hist.size == 2 * 1000  # memory stays at the bin count
+
+def test_counts_loss_and_calibration(data):
+    y, s, probs = data
+    m = _fill(StreamingMetrics(), y, probs)
+    pred = probs.argmax(axis=1)
+    cm = np.array([[np.sum((y == t) & (pred == p)) for p in range(2)] for t in range(2)])
+    np.testing.assert_array_equal(m.cm, cm)
+    p = np.clip(probs.astype(np.float64), 1e-7, 1 - 1e-7)
+    assert m.loss() == pytest.approx(-np.log(p[np.arange(len(y)), y]).mean(), rel=1e-9)
+    assert m.accuracy() == pytest.approx((pred == y).mean())
+    cal = m.calibration()
+    assert sum(cal["count"]) == len(y) and 0 <= cal["ece"] <= 1
+
+def test_batching_does_not_change_results(data):
+    y, _, probs = data
+    a = _fill(StreamingMetrics(exact=True), y, probs, batch=7).result()
+    b = _fill(StreamingMetrics(exact=True), y, probs, batch=len(y)).result()
+    assert a["confusion"] == b["confusion"]
+    for k in ("loss", "roc_auc", "average_precision", "ece"):
+        assert a[k] == pytest.approx(b[k], rel=1e-9)
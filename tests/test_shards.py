@@ -0,0 +1,35 @@
+import json
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("keras")
+from src.utils.shards import CLASSES, ShardSequence
+
+@pytest.fixture
+def shard_dir(tmp_path):
+    # two shards of 5 images each; pixel value = image number, so order is visible in the batches
+    rows = []
+    for s in range(2):
+        name = f"val-{s:05d}.npy"
+        np.save(tmp_path / name, np.stack([np.full((4, 4, 1), 5 * s + i, np.uint8) for i in range(5)]))
+        rows += [{"split": "val", "shard": name, "offset": i, "label": (5 * s + i) % 2, "path": f"img{5 * s + i}.png"}
+                 for i in range(5)]
+    pd.DataFrame(rows).to_csv(tmp_path / "index.csv", index=False)
+    (tmp_path / "meta.json").write_text(json.dumps({"img_size": [4, 4], "classes": CLASSES, "pipeline": None}))
+    return tmp_path
+
+def _order(seq):
+    return [int(round(v * 255)) for i in range(len(seq)) for v in seq[i][0][:, 0, 0, 0]]
+
+def test_unshuffled_order_is_index_order_every_epoch(shard_dir):
+    seq = ShardSequence(str(shard_dir), "val", batch_size=3, shuffle=False)
+    assert _order(seq) == list(range(10))
+    seq.on_epoch_end()
+    assert _order(seq) == list(range(10))
+    labels = np.concatenate([seq[i][1].argmax(axis=1) for i in range(len(seq))])
+    np.testing.assert_array_equal(labels, np.arange(10) % 2)
+
+def test_shuffled_order_is_a_permutation(shard_dir):
+    seq = ShardSequence(str(shard_dir), "val", batch_size=3, shuffle=True, seed=0)
+    assert sorted(_order(seq)) == list(range(10))
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+from src.preprocessing import pipelines as P
+from src.benchmarks.synthetic import synthetic_mammogram
+
+def _global_fft(img, ksize, K):
+    # reference: one FFT over the whole image, the path used for images up to _WIENER_GLOBAL_MAX
+    ksize, K = P._wiener_params(ksize, K)
+    g_f = img.astype(np.float32) / 255.0
+    W = P._wiener_transfer(g_f.shape, ksize, K)
+    return P._wiener_u8(np.ascontiguousarray(np.fft.ifft2(W * np.fft.fft2(g_f)).real))
+
+@pytest.fixture(scope="module")
+def large_img():
+    return synthetic_mammogram((1300, 1100), seed=3)
+
+@pytest.mark.parametrize("ksize,K", [(3, 1e-1), (7, 1e-2), (7, 1e-3), (15, 1e-2)])
+def test_tiled_matches_global_fft(large_img, ksize, K):
+    assert P._wiener_use_tiles(large_img.shape, *P._wiener_params(ksize, K))
+    diff = np.abs(P.wiener(large_img, ksize, K).astype(int) - _global_fft(large_img, ksize, K))
+    assert diff.max() <= 1
+
+@pytest.mark.parametrize("ksize,K", [(7, 1e-4), (7, 1e-5), (7, 1e-6), (15, 5e-4)])
+def test_small_k_falls_back_to_global_fft(large_img, ksize, K):
+    k, KK = P._wiener_params(ksize, K)
+    assert P._wiener_margin(k, KK) > P._WIENER_MAX_MARGIN
+    assert not P._wiener_use_tiles(large_img.shape, k, KK)
+    np.testing.assert_array_equal(P.wiener(large_img, ksize, K), _global_fft(large_img, ksize, K))
+
+def test_small_images_never_tiled():
+    assert not P._wiener_use_tiles((P._WIENER_GLOBAL_MAX, 800), 7, 1e-1)
+
+def test_wiener_stack_matches_single():
+    imgs = [synthetic_mammogram((300, 240), seed=i) for i in range(3)] + [synthetic_mammogram((1100, 900), seed=9)]
+    for out, img in zip(P.wiener_stack(imgs, 7, 1e-5), imgs):
+        np.testing.assert_array_equal(out, P.wiener(img, 7, 1e-5))